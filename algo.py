@@ -1,8 +1,8 @@
 from collections import deque
-import time
 import sys
 import random
 
+import instrumentation
 from vector_operations import vector_sub, non_pos, all_subvectors_of
 from download_problems import read_problem
 
@@ -11,8 +11,19 @@ from download_problems import read_problem
 # TODO: The vectors were sorted, so they are not in the same order as the input order. Make something so that the return value makes sense with the vectors in the order from the input.
 # TODO: Change return value to vectors selected or course codes selected.
 def make_query_function(credit_maxes, vectors):
-	start = time.time()
+	with instrumentation.span('assertions on input'):
+		check_input(credit_maxes, vectors)
 
+	# Sort vectors
+	with instrumentation.span('sorting vectors'):
+		vectors = sorted(vectors, reverse = True)
+
+	with instrumentation.span('building dp tables'):
+		table1, table2 = build_tables(credit_maxes, vectors)
+
+	return make_query(credit_maxes, vectors, table1, table2)
+
+def check_input(credit_maxes, vectors):
 	assert isinstance(credit_maxes, tuple), 'The credits vector was a non-tuple'
 	for x in credit_maxes:
 		assert isinstance(x, int), 'A credits value was a non-int'
@@ -32,14 +43,9 @@ def make_query_function(credit_maxes, vectors):
 			assert isinstance(x, int), 'A vector value was a non-int'
 			assert x == 0 or x == 1, 'A vector value was not 0 or 1'
 
-	print('Assertions on input took {:.2f} seconds'.format(time.time() - start))
-	start = time.time()
-
-	# Sort vectors
-	vectors = sorted(vectors, reverse = True)
-	print('Sorting vectors took {:.2f} seconds'.format(time.time() - start))
-	start = time.time()
-
+# Input: the credit_maxes and the sorted vectors of the vector problem
+# Return: table1 and table2, described below
+def build_tables(credit_maxes, vectors):
 	# Computation path priority queue
 	# new_queue[unfulfilled_credits] = minimal subset (by key = lambda x: (len(x), x[-1])) of vectors seen that leaves exactly unfulfilled_credits unfulfilled and should be recursed on
 	new_queue = dict()
@@ -56,10 +62,7 @@ def make_query_function(credit_maxes, vectors):
 	# Computation status
 	processed_nodes = 0
 
-	# Print status
-	print('we have {:d} vectors, each of length {:d}'.format(len(vectors), len(vectors[0])))
-	print('we must fulfill credits {!s:s}'.format(credit_maxes))
-	print('building the input required {:.2f} seconds'.format(time.time() - start))
+	instrumentation.point('problem', vectors = len(vectors), length = len(vectors[0]), credit_maxes = credit_maxes)
 	
 	right_bounds = [0] * len(credit_maxes)
 	i = 0
@@ -67,21 +70,19 @@ def make_query_function(credit_maxes, vectors):
 		while i < len(vectors) and vectors[i][j] == 1:
 			i += 1
 		right_bounds[j] = i
-	
-	start = time.time()
 
 	# Computation loop
+	level = 0
 	while len(new_queue) > 0:
 		# Progress priority queue
 		old_queue = new_queue
 		new_queue = dict()
+		instrumentation.point('level', level = level, frontier_states = len(old_queue), processed_nodes = processed_nodes)
+		instrumentation.count('states_expanded', len(old_queue))
+		processed_nodes += len(old_queue)
+		level += 1
 
 		for credits_required, selected_vectors in old_queue.items():
-			# Print computation status
-			if processed_nodes % 1000 == 0:
-				print('Processed nodes:', processed_nodes)
-			processed_nodes += 1
-
 			# Extract node from queue
 			len_selected_vectors = len(selected_vectors)
 			assert not non_pos(credits_required)
@@ -115,11 +116,10 @@ def make_query_function(credit_maxes, vectors):
 					if not non_pos(new_credits_required):
 						new_queue[new_credits_required] = selected_vectors + [i]
 
-	print('building dp tables required {:.2f} seconds'.format(time.time() - start))
-	start = time.time()
-
-	# Make query function out of vectors and table1 and table2
+	return table1, table2
 
+# Make query function out of vectors and table1 and table2
+def make_query(credit_maxes, vectors, table1, table2):
 	def vector_add(a, b):
 		return vector_sub(credit_maxes, vector_sub(vector_sub(credit_maxes, a), b))
 	
@@ -186,6 +186,7 @@ if __name__ == '__main__':
 		print()
 		print('python3 {:s} filename'.format(__file__))
 	else:
+		instrumentation.report_to_terminal()
 		credit_maxes, unsorted_vectors = read_problem(sys.argv[1])
 		query = make_query_function(credit_maxes, unsorted_vectors)
 
@@ -2,53 +2,273 @@ from collections import deque
 import time
 import sys
 import random
+import multiprocessing
 
-from vector_operations import vector_sub, non_pos, vector_le
+import numpy as np
+
+import instrumentation
+from vector_operations import vector_sub, non_pos, vector_le, vector_to_int, vector_strides, int_vector_digits, int_vector_add
 from download_problems import read_problem
 
-# Input: the credit_maxes and vectors of the vector problem
-# Return: A function that takes as input a set of unfulfilled credits and returns a set of indices of vectors that fulfills those credits
-# TODO: The vectors were sorted, so they are not in the same order as the input order. Make something so that the return value makes sense with the vectors in the order from the input.
-# TODO: Change return value to vectors selected or course codes selected.
-def make_query_function(credit_maxes, vectors):
-	start = time.time()
+# A dict-like table from states encoded by vector_to_int to (len(S), S[-1]) for a set S of vectors.
+# Values are stored in two parallel typed arrays, using 3 bytes per state of the credit_maxes box instead of a dict entry.
+# table[credit_maxes] = (0, -1) is handled as a special case because -1 cannot be stored in an unsigned array.
+class DenseTable:
+	# Value of sizes[encoded] when encoded is not a key of the table
+	UNSEEN = 255
 
-	assert isinstance(credit_maxes, tuple), 'The credits vector was a non-tuple'
+	# If shared, sizes is backed by shared_sizes, a multiprocessing.RawArray that can be passed to worker processes.
+	def __init__(self, credit_maxes, shared = False):
+		max_nodes = 1
+		for x in credit_maxes:
+			max_nodes *= x + 1
+		self.credit_maxes = credit_maxes
+		self.encoded_credit_maxes = max_nodes - 1
+		if shared:
+			self.shared_sizes = multiprocessing.RawArray('B', max_nodes)
+			self.sizes = np.frombuffer(self.shared_sizes, dtype = np.uint8)
+			self.sizes[:] = DenseTable.UNSEEN
+		else:
+			self.sizes = np.full(max_nodes, DenseTable.UNSEEN, dtype = np.uint8)
+		self.last_indices = np.zeros(max_nodes, dtype = np.uint16)
+
+	def __contains__(self, key):
+		return self.sizes.item(key) != DenseTable.UNSEEN
+
+	def __getitem__(self, key):
+		size = self.sizes.item(key)
+		if size == DenseTable.UNSEEN:
+			raise KeyError(key)
+		if key == self.encoded_credit_maxes:
+			return (0, -1)
+		return (size, self.last_indices.item(key))
+
+	def __setitem__(self, key, value):
+		if key == self.encoded_credit_maxes:
+			assert value == (0, -1)
+			self.sizes[key] = 0
+			return
+		assert 0 < value[0] and value[0] < DenseTable.UNSEEN
+		self.sizes[key] = value[0]
+		self.last_indices[key] = value[1]
+
+	def __len__(self):
+		return int(np.count_nonzero(self.sizes != DenseTable.UNSEEN))
+
+# Max number of (state, vector) pairs held in memory at once while expanding a level in numpy_build
+NUMPY_BUILD_CHUNK_ELEMENTS = 1 << 23
+
+# A level of numpy_build is only split between processes if each process gets at least this many states
+PARALLEL_BUILD_MIN_SHARD_STATES = 1 << 12
+# Number of shards per process that a level is split into, so that processes that finish early can take another shard
+PARALLEL_BUILD_SHARDS_PER_PROCESS = 4
+
+# Input: the sorted vectors of the vector problem
+# Return: class_of, class_starts, class_ends, where the copies of the cth distinct vector are vectors[class_starts[c]:class_ends[c]] and vectors[i] is a copy of the class_of[i]th distinct vector
+def vector_classes(vectors):
+	class_of = []
+	class_starts = []
+	class_ends = []
+	for i, v in enumerate(vectors):
+		if i == 0 or v != vectors[i - 1]:
+			class_starts.append(i)
+			class_ends.append(i)
+		class_of.append(len(class_starts) - 1)
+		class_ends[-1] = i + 1
+	return class_of, class_starts, class_ends
+
+# Input: the credit_maxes and the sorted vectors of the vector problem
+# Return: the sorted vectors without the vectors that are never needed in a minimal set.
+# These are vectors of all 0s and copies of a vector beyond max(credit_maxes[j] where vector[j] == 1), since those copies leave no credits to fulfill.
+# A vector that is smaller than another vector is still kept, since it is in minimal sets that are as small as the ones with the other vector.
+def remove_unneeded_vectors(credit_maxes, vectors):
+	out = []
+	for i, v in enumerate(vectors):
+		needed_copies = max([a if b != 0 else 0 for a, b in zip(credit_maxes, v)])
+		copies = 1
+		while copies <= len(out) and out[-copies] == v:
+			copies += 1
+		if copies <= needed_copies:
+			out.append(v)
+	return out
+
+# Input: the states of a level and the index of the vector that led to each of them
+# Return: the distinct states, each with the least index that led to it
+def group_min(states, indices):
+	order = np.lexsort((indices, states))
+	states = states[order]
+	indices = indices[order]
+	first = np.ones(len(states), dtype = bool)
+	first[1:] = states[1:] != states[:-1]
+	return states[first], indices[first]
+
+# Arrays used by expand_states. Worker processes of numpy_build receive them once through set_expansion_context.
+expansion_context = None
+
+# context['sizes'] is DenseTable.sizes of the table being built. In worker processes, it is viewed from context['shared_sizes'].
+def set_expansion_context(context):
+	global expansion_context
+	if 'shared_sizes' in context:
+		context = dict(context)
+		context['sizes'] = np.frombuffer(context['shared_sizes'], dtype = np.uint8)
+	expansion_context = context
+
+# Input: the credit_maxes and the sorted vectors of the vector problem and the DenseTable being built
+# Return: the arrays that expand_states needs
+def make_expansion_context(credit_maxes, vectors, table):
+	context = dict()
+	context['sizes'] = table.sizes
+	context['strides'] = np.array(vector_strides(credit_maxes), dtype = np.int64)
+	context['radixes'] = np.array([x + 1 for x in credit_maxes], dtype = np.int64)
+	# Vector values are 0 or 1
+	vector_rows = np.array(list(vectors) + [(0,) * len(credit_maxes)], dtype = np.int64)
+	context['vector_rows'] = vector_rows
+	context['len_vectors'] = len(vectors)
+
+	# class_of[len(vectors)] is the number of distinct vectors, so that no distinct vector comes after it
+	class_of, class_starts, class_ends = vector_classes(vectors)
+	context['class_of'] = np.array(class_of + [len(class_starts)], dtype = np.int64)
+	context['class_starts'] = np.array(class_starts, dtype = np.int64)
+	context['class_matrix'] = vector_rows[context['class_starts']].T
+	context['class_range'] = np.arange(len(class_starts), dtype = np.int64)
+	context['chunk_rows'] = max(1, NUMPY_BUILD_CHUNK_ELEMENTS // len(class_starts))
+	return context
+
+# Input: (frontier_states, frontier_left_bounds), where frontier_left_bounds[j] = table[frontier_states[j]][1] + 1
+# Return: group_min of the states not in the table that are reached by selecting one more vector, and the indices of those vectors
+# Selecting any copy of a distinct vector other than the first unselected copy leads to the same state with a greater index, so only first unselected copies are expanded.
+def expand_states(frontier):
+	frontier_states, frontier_left_bounds = frontier
+	context = expansion_context
+	strides = context['strides']
+	radixes = context['radixes']
+	vector_rows = context['vector_rows']
+	class_of = context['class_of']
+	class_starts = context['class_starts']
+	class_matrix = context['class_matrix']
+	class_range = context['class_range']
+	chunk_rows = context['chunk_rows']
+	sizes = context['sizes']
+
+	level_states = []
+	level_indices = []
+	for chunk_start in range(0, len(frontier_states), chunk_rows):
+		states = frontier_states[chunk_start:chunk_start + chunk_rows]
+		left_bounds = frontier_left_bounds[chunk_start:chunk_start + chunk_rows]
+
+		# Vectorized vector_sub of every vector from every state
+		# Since vector values are 0 or 1, a vector decrements exactly the nonzero components of the state that it has a 1 in.
+		decrements = (states[:, None] // strides[None, :] % radixes[None, :] != 0) * strides[None, :]
+		class_states = states[:, None] - decrements @ class_matrix
+		copy_states = states - (decrements * vector_rows[left_bounds]).sum(axis = 1)
+
+		# Select classes in order: the next copy of the last selected vector, and the first copy of every later distinct vector
+		mask = class_range[None, :] > class_of[left_bounds][:, None]
+		has_copy = left_bounds < context['len_vectors']
+		indices = np.concatenate((np.broadcast_to(class_starts[None, :], class_states.shape)[mask], left_bounds[has_copy]))
+		new_states = np.concatenate((class_states[mask], copy_states[has_copy]))
+
+		# Only keep states not reached by smaller sets
+		unseen = sizes[new_states] == DenseTable.UNSEEN
+		new_states, indices = group_min(new_states[unseen], indices[unseen])
+		level_states.append(new_states)
+		level_indices.append(indices)
+
+	return group_min(np.concatenate(level_states), np.concatenate(level_indices))
+
+# Input: the credit_maxes and the sorted vectors of the vector problem
+# Return: DenseTable before the closure pass, the same table that the python engine of make_query_function computes
+# Every state in a level of the search has the same set size, so a whole level is expanded against all distinct vectors at once.
+# A state that is reached for the first time at a level gets the least vector index among all the ways it was reached at that level.
+# If processes > 1, levels with at least PARALLEL_BUILD_MIN_SHARD_STATES states per process are split into shards that are expanded in a process pool.
+# The minima of the shards are merged with group_min, so the table is the same for any number of processes.
+def numpy_build(credit_maxes, vectors, processes = 1):
+	max_nodes = 1
 	for x in credit_maxes:
-		assert isinstance(x, int), 'A credits value was a non-int'
-		assert 1 <= x, 'A credits value was not 0 or 1'
+		max_nodes *= x + 1
+	encoded_credit_maxes = max_nodes - 1
 
-	assert isinstance(vectors, tuple), 'The list of vectors was a non-tuple'
-	assert 1 <= len(vectors), '0 vectors were provided'
+	# Worker processes read the sizes of the table through shared memory, which is only written between levels.
+	table = DenseTable(credit_maxes, shared = processes > 1)
+	table[encoded_credit_maxes] = (0, -1)
 
-	for v in vectors:
-		assert isinstance(v, tuple), 'A vector was a non-tuple'
+	context = make_expansion_context(credit_maxes, vectors, table)
+	set_expansion_context(context)
+	pool = None
+	if processes > 1:
+		worker_context = dict(context)
+		del worker_context['sizes']
+		worker_context['shared_sizes'] = table.shared_sizes
+		pool = multiprocessing.Pool(processes, initializer = set_expansion_context, initargs = (worker_context,))
 
-	for v in vectors:
-		assert len(v) == len(credit_maxes), 'Vectors differ in length'
+	# frontier_states[j] is a state to be recursed on and frontier_left_bounds[j] = table[frontier_states[j]][1] + 1
+	frontier_states = np.array([encoded_credit_maxes], dtype = np.int64)
+	frontier_left_bounds = np.zeros(1, dtype = np.int64)
 
-	for v in vectors:
-		for x in v:
-			assert isinstance(x, int), 'A vector value was a non-int'
-			assert x == 0 or x == 1, 'A vector value was not 0 or 1'
+	# Computation status
+	processed_nodes = 0
+	len_selected_vectors = 0
+
+	# Computation loop
+	try:
+		while len(frontier_states) > 0:
+			instrumentation.point('level', level = len_selected_vectors, frontier_states = len(frontier_states), completed = processed_nodes / max_nodes)
+			instrumentation.count('states_expanded', len(frontier_states))
+			processed_nodes += len(frontier_states)
+			len_selected_vectors += 1
+
+			if pool is not None and len(frontier_states) >= processes * PARALLEL_BUILD_MIN_SHARD_STATES:
+				shard_bounds = np.linspace(0, len(frontier_states), processes * PARALLEL_BUILD_SHARDS_PER_PROCESS + 1).astype(np.int64)
+				shards = [(frontier_states[x:y], frontier_left_bounds[x:y]) for x, y in zip(shard_bounds[:-1], shard_bounds[1:]) if x < y]
+				results = pool.map(expand_states, shards)
+				new_states, indices = group_min(np.concatenate([x[0] for x in results]), np.concatenate([x[1] for x in results]))
+			else:
+				new_states, indices = expand_states((frontier_states, frontier_left_bounds))
 
+			# Store minimal subsets in tables
+			table.sizes[new_states] = len_selected_vectors
+			table.last_indices[new_states] = indices
+			instrumentation.count('new_entries', len(new_states))
+
+			# Recurse on minimal subsets
+			not_done = new_states != 0
+			frontier_states = new_states[not_done]
+			frontier_left_bounds = indices[not_done] + 1
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+	return table
+
+# Input: the credit_maxes and the sorted vectors of the vector problem
+# Return: DenseTable before the closure pass, computed by expanding one state at a time
+def python_build(credit_maxes, vectors):
 	max_nodes = 1
 	for x in credit_maxes:
 		max_nodes *= x + 1
-	
-	# Sort vectors
-	vectors = sorted(vectors, reverse = True)
+
+	# vector_digits[i] is used to subtract vectors[i] from an encoded state.
+	vector_digits = [int_vector_digits(credit_maxes, v) for v in vectors]
+	encoded_credit_maxes = vector_to_int(credit_maxes, credit_maxes)
+
+	# next_indices[left_bound] are the vectors that are selected after a set whose greatest index is left_bound - 1.
+	# These are the next copy of the last selected vector and the first copy of every later distinct vector.
+	# Other copies lead to the same states as these with greater indices.
+	class_of, class_starts, class_ends = vector_classes(vectors)
+	next_indices = [[i] + class_starts[class_of[i] + 1:] for i in range(len(vectors))] + [[]]
 
 	# Computation path priority queue
 	# We recurse on all sets of vectors in the standard order.
 	# new_queue holds the largest subsets (by size) to be recursed on.
 	new_queue = set()
-	new_queue.add(credit_maxes)
+	new_queue.add(encoded_credit_maxes)
 
 	# table[unfulfilled_credits] = min over all seen sets S of vectors that leave unfulfilled_credits unfulfilled of (len(S), S[-1])
 	# unfulfilled_credits == credit_maxes is an exception to the above statement. table[credit_maxes] = (0, -1)
-	table = dict()
-	table[credit_maxes] = (0, -1)
+	# Keys are encoded by vector_to_int.
+	table = DenseTable(credit_maxes)
+	table[encoded_credit_maxes] = (0, -1)
 
 	# Computation status
 	processed_nodes = 0
@@ -61,28 +281,35 @@ def make_query_function(credit_maxes, vectors):
 		right_bounds[j] = i
 
 	# Computation loop
+	level = 0
 	while len(new_queue) > 0:
 		# Progress priority queue
 		old_queue = new_queue
 		new_queue = set()
+		instrumentation.point('level', level = level, frontier_states = len(old_queue), completed = processed_nodes / max_nodes)
+		instrumentation.count('states_expanded', len(old_queue))
+		processed_nodes += len(old_queue)
+		level += 1
+		if instrumentation.enabled():
+			entries_before = len(table)
+
 		for credits_required in old_queue:
-			# Print computation status
-			if processed_nodes % 1000 == 0:
-				print('At least {:6.2f} % complete.'.format(processed_nodes / max_nodes * 100))
-			processed_nodes += 1
 
 			# Extract node from queue
-			assert not non_pos(credits_required)
+			assert credits_required != 0
 			len_selected_vectors, left_bound = table[credits_required]
 			left_bound += 1
 			assert (len_selected_vectors == 0) is (left_bound == 0)
 
 			# Add classes
-			for i in range(left_bound, len(vectors)):
+			for i in next_indices[left_bound]:
 				# Add vector i to selected vectors
-				# Inlined vector_sub function call for slightly better performance
-				# new_credits_required = vector_sub(credits_required, vectors[i])
-				new_credits_required = tuple([a - b if a > b else 0 for a, b in zip(credits_required, vectors[i])])
+				# Inlined int_vector_sub function call for slightly better performance
+				# new_credits_required = int_vector_sub(credits_required, vector_digits[i])
+				new_credits_required = credits_required
+				for stride, radix, b in vector_digits[i]:
+					a = new_credits_required // stride % radix
+					new_credits_required -= (a if a < b else b) * stride
 				new_set_values = (1 + len_selected_vectors, i)
 				
 				# Store minimal subsets in tables
@@ -90,38 +317,163 @@ def make_query_function(credit_maxes, vectors):
 					table[new_credits_required] = new_set_values
 
 					# Recurse on minimal subsets
-					if not non_pos(new_credits_required):
+					if new_credits_required != 0:
 						new_queue.add(new_credits_required)
 
-	print('building dp tables required {:.2f} seconds'.format(time.time() - start))
-	start = time.time()
+		if instrumentation.enabled():
+			instrumentation.count('new_entries', len(table) - entries_before)
+
+	return table
+
+# Input: DenseTable returned by python_build or numpy_build
+# Afterwards, table[unfulfilled_credits] stores values for subsets that leave at most unfulfilled_credits unfulfilled
+# That value is the min of the table over all vectors v <= unfulfilled_credits, which is a running min along every axis of the credit_maxes box.
+def close_table(table):
+	credit_maxes = table.credit_maxes
+	strides = vector_strides(credit_maxes)
+	max_nodes = table.encoded_credit_maxes + 1
+
+	# keys[encoded] = (size << 16) | last_index, so that comparing keys is the same as comparing (size, last_index)
+	unseen_key = np.iinfo(np.uint32).max
+	keys = (table.sizes.astype(np.uint32) << 16) | table.last_indices
+	keys[table.sizes == DenseTable.UNSEEN] = unseen_key
+	keys[table.encoded_credit_maxes] = 0
+
+	if instrumentation.enabled():
+		keys_before = keys.copy()
+
+	for x, stride in zip(credit_maxes, strides):
+		# The encoded ints viewed as (higher places, this place, lower places)
+		axis_view = keys.reshape(max_nodes // (stride * (x + 1)), x + 1, stride)
+		np.minimum.accumulate(axis_view, axis = 1, out = axis_view)
+
+	assert not np.any(keys == unseen_key)
+	if instrumentation.enabled():
+		instrumentation.count('improved_entries', int(np.count_nonzero(keys != keys_before)))
+	table.sizes[:] = keys >> 16
+	table.last_indices[:] = keys & 0xFFFF
+
+# Input: the credit_maxes and vectors of the vector problem
+# Return: the categories in groups, where the categories of a group have the same value in every vector. Groups are sorted by their first category.
+# Every vector then fulfills the same number of credits in each category of a group, so a set of vectors fulfills the credits left in all of them
+# if and only if it fulfills the most credits left in any of them. Their credit_maxes do not have to be equal.
+def merged_categories(credit_maxes, vectors):
+	groups = dict()
+	for j in range(len(credit_maxes)):
+		groups.setdefault(tuple([v[j] for v in vectors]), []).append(j)
+	return sorted(groups.values())
+
+# Input: the credit_maxes and vectors of the vector problem, and the groups of merged_categories
+# Return: the credit_maxes and vectors of the vector problem with one category per group
+# Vectors keep their order, and so does sorted order, since a category that is left out has the same values as an earlier category that is kept.
+def merge_categories(credit_maxes, vectors, groups):
+	merged_credit_maxes = tuple([max([credit_maxes[j] for j in group]) for group in groups])
+	merged_vectors = [tuple([v[group[0]] for group in groups]) for v in vectors]
+	return merged_credit_maxes, merged_vectors
 
-	def recurse(prefix):
-		if len(prefix) < len(credit_maxes):
-			for i in range(credit_maxes[len(prefix)] + 1):
-				recurse(prefix + [i])
+# Return: an array that maps every state of credit_maxes, encoded by vector_to_int, to the encoded state of the merged vector problem with the same table entry
+# In the merged state, a group has the most credits left of any of its categories.
+def merged_state_map(credit_maxes, groups):
+	merged_credit_maxes = tuple([max([credit_maxes[j] for j in group]) for group in groups])
+	shape = tuple([x + 1 for x in credit_maxes])
+	merged_states = vector_to_int(merged_credit_maxes, merged_credit_maxes) + 1
+	state_map = np.zeros(shape, dtype = np.int32 if merged_states <= np.iinfo(np.int32).max else np.int64)
+	for group, x, stride in zip(groups, merged_credit_maxes, vector_strides(merged_credit_maxes)):
+		# Credits left in the group, with the axes of the other categories of length 1 so that it broadcasts over them
+		credits_left = np.zeros([1] * len(credit_maxes), dtype = state_map.dtype)
+		for j in group:
+			axis_shape = [1] * len(credit_maxes)
+			axis_shape[j] = credit_maxes[j] + 1
+			credits_left = np.maximum(credits_left, (credit_maxes[j] - np.arange(credit_maxes[j] + 1, dtype = state_map.dtype)).reshape(axis_shape))
+		state_map += (x - credits_left) * stride
+	return state_map.reshape(-1)
+
+# Input: the credit_maxes and the sorted vectors of the vector problem
+# Return: DenseTable where table[fulfilled_credits] = min over all sets S of vectors that fulfill credit_maxes given fulfilled_credits of (len(S), S[-1])
+# engine is 'numpy' to expand each level of the search with numpy_build or 'python' to expand one state at a time.
+# processes is the number of processes numpy_build uses.
+# If categories can be merged (see merged_categories), the table is built for the merged vector problem, which has fewer states,
+# and then expanded to every state of credit_maxes. The sets S are the same for a state and its merged state, so the table is the same.
+def build_table(credit_maxes, vectors, engine = 'numpy', processes = 1):
+	assert engine in ('python', 'numpy'), 'Unknown engine'
+
+	# These assertions ensure that the values fit in DenseTable.
+	assert len(vectors) <= (1 << 16)
+
+	states = vector_to_int(credit_maxes, credit_maxes) + 1
+
+	groups = merged_categories(credit_maxes, vectors)
+	if len(groups) < len(credit_maxes):
+		merged_credit_maxes, merged_vectors = merge_categories(credit_maxes, vectors, groups)
+		instrumentation.point('merged categories', groups = [group for group in groups if len(group) > 1], states = states, merged_states = vector_to_int(merged_credit_maxes, merged_credit_maxes) + 1)
+		merged_table = build_table(merged_credit_maxes, merged_vectors, engine, processes)
+		with instrumentation.span('expanding merged table', states = states):
+			table = DenseTable(credit_maxes)
+			state_map = merged_state_map(credit_maxes, groups)
+			np.take(merged_table.sizes, state_map, out = table.sizes)
+			np.take(merged_table.last_indices, state_map, out = table.last_indices)
+		return table
+	with instrumentation.span('building dp tables', engine = engine, processes = processes, states = states, vectors = len(vectors)):
+		if engine == 'numpy':
+			table = numpy_build(credit_maxes, vectors, processes)
 		else:
-			for i in range(len(credit_maxes)):
-				if 0 < prefix[i]:
-					# Same vector except ith place decremented
-					subvector = tuple([x - 1 if i == j else x for j, x in enumerate(prefix)])
-					assert subvector in table
-					tuple_prefix = tuple(prefix)
-					table_subvector = table[subvector]
-					if tuple_prefix not in table or table_subvector < table[tuple_prefix]:
-						table[tuple_prefix] = table_subvector
-
-	recurse([])
-
-	print('recursing through vector space required {:.2f} seconds'.format(time.time() - start))
-	start = time.time()
-
-	def vector_add(a, b):
-		return vector_sub(credit_maxes, vector_sub(vector_sub(credit_maxes, a), b))
+			table = python_build(credit_maxes, vectors)
+
+	with instrumentation.span('recursing through vector space', states = states):
+		close_table(table)
+
+	return table
+
+# Input: the credit_maxes and vectors of the vector problem
+# Return: A function that takes as input a set of unfulfilled credits and returns a set of indices of vectors that fulfills those credits
+# TODO: The vectors were sorted, so they are not in the same order as the input order. Make something so that the return value makes sense with the vectors in the order from the input.
+# TODO: Change return value to vectors selected or course codes selected.
+# engine and processes are passed to build_table.
+# If table is not None, it is used instead of computing the table. It must be build_table's table for these vectors.
+def make_query_function(credit_maxes, vectors, engine = 'numpy', processes = 1, table = None):
+	assert isinstance(credit_maxes, tuple), 'The credits vector was a non-tuple'
+	for x in credit_maxes:
+		assert isinstance(x, int), 'A credits value was a non-int'
+		assert 1 <= x, 'A credits value was not 0 or 1'
+
+	assert isinstance(vectors, tuple), 'The list of vectors was a non-tuple'
+	assert 1 <= len(vectors), '0 vectors were provided'
+
+	for v in vectors:
+		assert isinstance(v, tuple), 'A vector was a non-tuple'
+
+	for v in vectors:
+		assert len(v) == len(credit_maxes), 'Vectors differ in length'
+
+	for v in vectors:
+		for x in v:
+			assert isinstance(x, int), 'A vector value was a non-int'
+			assert x == 0 or x == 1, 'A vector value was not 0 or 1'
+
+	max_nodes = 1
+	for x in credit_maxes:
+		max_nodes *= x + 1
 	
+	# Sort vectors
+	vectors = sorted(vectors, reverse = True)
+	vectors = remove_unneeded_vectors(credit_maxes, vectors)
+
+	# States are vectors of unfulfilled credits encoded as ints by vector_to_int.
+	# This avoids building and hashing a tuple for every (state, vector) pair.
+	# vector_digits[i] is used to add vectors[i] to an encoded state.
+	vector_digits = [int_vector_digits(credit_maxes, v) for v in vectors]
+	class_of, class_starts, class_ends = vector_classes(vectors)
+	encoded_credit_maxes = vector_to_int(credit_maxes, credit_maxes)
+	assert encoded_credit_maxes == max_nodes - 1
+
+	if table is None:
+		table = build_table(credit_maxes, vectors, engine, processes)
+	assert table.credit_maxes == credit_maxes
+
+	# fulfilled_credits is encoded by vector_to_int
 	def query_helper(fulfilled_credits, selected_vectors):
 		# Base case: All credits fulfilled
-		if fulfilled_credits == credit_maxes:
+		if fulfilled_credits == encoded_credit_maxes:
 			return selected_vectors
 
 		# Must select courses in order
@@ -130,12 +482,15 @@ def make_query_function(credit_maxes, vectors):
 			right_bound = selected_vectors[0]
 		
 		# Randomly select a vector to add to the set
-		vec_indices = range(table[fulfilled_credits][1], right_bound)
-		vec_indices = list(vec_indices)
+		# Only the greatest copy of each distinct vector under right_bound is tried, since the sets found with smaller copies can also be found with it.
+		left_bound = table[fulfilled_credits][1]
+		if left_bound >= right_bound:
+			return None
+		vec_indices = [min(class_ends[c], right_bound) - 1 for c in range(class_of[left_bound], class_of[right_bound - 1] + 1)]
 		random.shuffle(vec_indices)
 		for i in vec_indices:
 			# Ignore vectors that do not lead closer to fulfilling credit_maxes
-			next_fulfilled_credits = vector_add(vectors[i], fulfilled_credits)
+			next_fulfilled_credits = int_vector_add(fulfilled_credits, vector_digits[i])
 			if table[fulfilled_credits][0] <= table[next_fulfilled_credits][0]: continue
 
 			# Recurse to find the full set of vectors
@@ -154,7 +509,8 @@ def make_query_function(credit_maxes, vectors):
 		credits_to_fulfill = vector_sub(credit_maxes, fulfilled_credits)
 		
 		# Compute set of vectors
-		res = query_helper(fulfilled_credits, [])
+		encoded_fulfilled_credits = vector_to_int(credit_maxes, fulfilled_credits)
+		res = query_helper(encoded_fulfilled_credits, [])
 		if res is None:
 			return None
 
@@ -165,7 +521,7 @@ def make_query_function(credit_maxes, vectors):
 		assert non_pos(unfulfilled_credits)
 		
 		# Assert set is minimal
-		assert len(res) == table[fulfilled_credits][0]
+		assert len(res) == table[encoded_fulfilled_credits][0]
 		
 		# Assert set contains no duplicates
 		assert len(res) == len(set(res))
@@ -181,6 +537,7 @@ if __name__ == '__main__':
 		print()
 		print('python3 {:s} filename'.format(__file__))
 	else:
+		instrumentation.report_to_terminal()
 		credit_maxes, unsorted_vectors = read_problem(sys.argv[1])
 		query = make_query_function(credit_maxes, unsorted_vectors)
 
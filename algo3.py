@@ -10,7 +10,9 @@ Values v which cannot equal 0 will have v-1 stored.
 
 file format:
 
-1 byte: if 0x00 then the table has been completely computed. Any other value means the table has not been completely computed.
+1 byte: TABLE_FINALIZED if the table has been completely computed. TABLE_UNFINISHED means the table has not been completely computed.
+	Files written before the tables were computed over the vectors left by remove_unneeded_vectors have TABLE_FINALIZED_ALL_VECTORS instead.
+	Their last indices count every sorted vector, so they are only read if remove_unneeded_vectors leaves out none of their vectors.
 1 byte: unsigned integer M, M + 1 = the number of hub unit categories
 2 bytes: big endian unsigned integer N, N + 1 = the number of vectors
 M + 1 bytes:
@@ -26,182 +28,293 @@ for i in range(vector_to_int(credit_maxes, credit_maxes)):
 		Exception: If int_to_vector(credit_maxes, i) == credit_maxes, these two bytes can be any value.
 	2 bytes: big endian unsigned integer whose value is table[int_to_vector(credit_maxes, i)][1]
 		Exception: If int_to_vector(credit_maxes, i) == credit_maxes, these two bytes can be any value.
+4 bytes: big endian CRC-32 of all the bytes above except the first. Files written before the checksum was added end without it.
+
+Packed table file format:
+
+The same table, stored in about a quarter of the space. Tables only have a few hundred distinct (size, last index) entries,
+so the distinct entries are stored once in a palette and every state stores the number of its entry in the palette with as few bits as possible.
+Integers are little endian unsigned integers.
+
+PACKED_TABLE_HEADER:
+	8 bytes: PACKED_TABLE_MAGIC if the table has been completely computed, or zero bytes if it has not
+	4 bytes: PACKED_TABLE_VERSION, 1 or 2
+	4 bytes: M, the number of hub unit categories
+	4 bytes: N, the number of vectors
+	4 bytes: P, the number of entries of the palette
+	4 bytes: W, the number of bits of every code
+M bytes: credit_maxes
+N * M bytes: the vectors, in the order of their ids
+P times 2 bytes: the sizes of the entries of the palette
+P times 2 bytes: the last indices of the entries of the palette
+for i in range(vector_to_int(credit_maxes, credit_maxes) + 1):
+	W bits: the code c of state i, so that table[i] is (sizes[c], last indices[c]). Bit j of the codes is bit j % 8 of byte j // 8.
+	Exception: The code of credit_maxes can be any value.
+4 bytes: in version 2, the CRC-32 of all the bytes above except the first 8. Zero bytes in version 1. They are also there so that 4 bytes can be read from where any code starts.
 '''
 
-from collections import deque
+from collections import deque, Counter, OrderedDict
 import time
 import sys
 import random
 import os
+import mmap
+import json
+import shutil
+import struct
+import threading
+import zlib
 
-from vector_operations import vector_sub, non_pos, vector_le, vector_to_int, int_to_vector
+import numpy as np
+
+import instrumentation
+from vector_operations import vector_sub, non_pos, vector_le, vector_to_int, int_to_vector, int_vector_digits, int_vector_add
+from algo2 import DenseTable, build_table, vector_classes, remove_unneeded_vectors
 from download_problems import read_problem
+from course_index import course_index_file_name
+
+# Number of states written to the table file per write call
+TABLE_WRITE_CHUNK_STATES = 1 << 20
+
+# query_many keeps the answers of at most this many distinct inputs, dropping the least recently used
+QUERY_MANY_MAX_ANSWERS = 1 << 16
+# query_many forgets the moves of the states it passed through when it has stored the moves of this many states
+QUERY_MANY_MAX_MOVE_STATES = 1 << 18
+
+# finalized flag, M - 1, N - 1
+TABLE_HEADER = struct.Struct('>BBH')
+TABLE_FINALIZED = 1
+TABLE_FINALIZED_ALL_VECTORS = 0
+TABLE_UNFINISHED = 255
+TABLE_CHECKSUM = struct.Struct('>I')
+
+# Number of bytes given to zlib.crc32 at once, which lets other threads run while it computes
+CHECKSUM_CHUNK_BYTES = 1 << 22
+
+PACKED_TABLE_MAGIC = b'HUBPTBL\x00'
+# Version 1 files have no checksum
+PACKED_TABLE_VERSION = 2
+PACKED_TABLE_HEADER = struct.Struct('<8sIIIII')
+# A code and the bits before it in its first byte fit in the 4 bytes read for it
+PACKED_TABLE_MAX_CODE_BITS = 24
+UINT32 = struct.Struct('<I')
+
+# Return: the CRC-32 of buffer[start:end]
+def file_checksum(buffer, start, end):
+	view = memoryview(buffer)
+	try:
+		checksum = 0
+		for chunk_start in range(start, end, CHECKSUM_CHUNK_BYTES):
+			checksum = zlib.crc32(view[chunk_start:min(chunk_start + CHECKSUM_CHUNK_BYTES, end)], checksum)
+		return checksum
+	finally:
+		view.release()
+
+# Return: whether file_name can be replaced by a new table file: it does not exist, is empty, or is a table file of either format whose computation was interrupted
+def can_overwrite_table_file(file_name):
+	try:
+		with open(file_name, 'rb') as file:
+			start = file.read(len(PACKED_TABLE_MAGIC))
+	except FileNotFoundError:
+		return True
+	# Unfinished files start with TABLE_UNFINISHED, or with zero bytes in place of PACKED_TABLE_MAGIC
+	return len(start) == 0 or start[0] == TABLE_UNFINISHED or start == bytes(len(PACKED_TABLE_MAGIC))
+
+'''
+verify is how the checksum of a finalized table file is checked:
+	'no': it is not checked.
+	'now': it is checked before this returns, and RuntimeError is raised if it does not match.
+	'background': it is checked by a daemon thread, so that opening the table stays fast. table.checksum_ok is None until the check is done.
+table.checksum_ok is then True or False, or None if the file has no checksum.
+'''
+def verify_table(table, verify, file_name):
+	assert verify in ('no', 'now', 'background')
+	if verify == 'now':
+		table.checksum_ok = table.verify()
+		if table.checksum_ok is False:
+			raise RuntimeError('the checksum of {:s} does not match'.format(file_name))
+	elif verify == 'background':
+		def check():
+			table.checksum_ok = table.verify()
+			instrumentation.point('table checksum', ok = table.checksum_ok)
+		threading.Thread(target = check, daemon = True).start()
+
+# Return: a dict from each vector to the tuple of ids of the vectors equal to it
+def make_vector_id_table(vectors_with_ids):
+	vector_id_table = dict()
+	for id, vector in vectors_with_ids:
+		if vector not in vector_id_table:
+			vector_id_table[vector] = []
+		vector_id_table[vector].append(id)
+	return {k: tuple(v) for k, v in vector_id_table.items()}
 
 # This table class code is very tightly coupled to the algorithm.
+# Keys are vectors encoded by vector_to_int.
+# A finalized table file is opened read-only. Raises RuntimeError if the file is not a finalized table file, or if the checksum does not match when verify is 'now'.
+# If create is True and the file does not exist, is empty or is a table file whose computation was interrupted, an empty table is made instead, to be written by write_table.
+# Any other file is never overwritten.
+# verify is 'no', 'now' or 'background'. See verify_table.
 class Table:
-	def __init__(self, file_name):
-		# Attempt to read the file
+	def __init__(self, file_name, create = True, verify = 'no'):
+		self.checksum_ok = None
 		try:
-			file_was_opened = False
-			file = open(file_name, 'r+b')
-			file_was_opened = True
-			file.seek(0)
-			
-			if file.read(1) != bytes([0]): raise RuntimeError
-			
-			next_bytes = file.read(1)
-			if len(next_bytes) != 1: raise RuntimeError
-			len_credit_maxes = int.from_bytes(next_bytes, byteorder='big', signed='False') + 1
-			
-			next_bytes = file.read(2)
-			if len(next_bytes) != 2: raise RuntimeError
-			len_vectors = int.from_bytes(next_bytes, byteorder='big', signed='False') + 1
-			
-			credit_maxes = deque()
-			for _ in range(len_credit_maxes):
-				next_bytes = file.read(1)
-				if len(next_bytes) != 1: raise RuntimeError
-				credit_maxes.append(int.from_bytes(next_bytes, byteorder='big', signed='False') + 1)
-			credit_maxes = tuple(credit_maxes)
-			
-			vectors_with_ids = deque()
-			for i in range(len_vectors):
-				next_bytes = file.read(2)
-				if len(next_bytes) != 2: raise RuntimeError
-				id = int.from_bytes(next_bytes, byteorder='big', signed='False')
-				assert id == i
-				
-				vector = deque()
-				for _ in range(len_credit_maxes):
-					next_bytes = file.read(1)
-					if len(next_bytes) != 1: raise RuntimeError
-					vector.append(int.from_bytes(next_bytes, byteorder='big', signed='False'))
-				vector = tuple(vector)
-				vectors_with_ids.append((id, vector))
-			vectors_with_ids = tuple(vectors_with_ids)
-			
-			file.seek(0, 2)
-			if file.tell() != 1 + 1 + 2 + len(credit_maxes) + len(vectors_with_ids) * (2 + len(credit_maxes)) + (vector_to_int(credit_maxes, credit_maxes) + 1) * 4:
-				raise RuntimeError
-			
-			self.credit_maxes = credit_maxes
-			self.vector_id_table = dict()
-			for id, vector in vectors_with_ids:
-				if vector not in self.vector_id_table:
-					self.vector_id_table[vector] = set()
-				self.vector_id_table[vector].add(id)
-			self.vector_id_table = {k: tuple(v) for k, v in self.vector_id_table.items()}
-			self.table_offset = 4 + len(credit_maxes) + len(vectors_with_ids) * (2 + len(credit_maxes))
-			self.file = file
-			self.initialized = True
-			self.finalized = True
-		except Exception as e:
-			if file_was_opened:
-				file.close()
-		
+			self.open_finalized(file_name)
+		except (OSError, RuntimeError) as e:
+			if not create:
+				raise RuntimeError('{:s} is not a finalized table file: {!s:s}'.format(file_name, e)) from e
+			if not can_overwrite_table_file(file_name):
+				raise RuntimeError('{:s} is not a table file whose computation was interrupted, so it is not overwritten: {!s:s}'.format(file_name, e)) from e
+
 			# Make directory of write location
-			try:
-				os.makedirs(os.path.dirname(file_name))
-			except FileExistsError:
-				pass
+			if os.path.dirname(file_name) != '':
+				os.makedirs(os.path.dirname(file_name), exist_ok = True)
 
 			# Open file
 			self.file = open(file_name, 'w+b')
-			self.file.seek(0, 2)
-			assert self.file.tell() == 0
 			self.initialized = False
 			self.finalized = False
+			return
+		verify_table(self, verify, file_name)
+
+	# Reads the header and the vectors with one read each and memory-maps the table
+	def open_finalized(self, file_name):
+		file = open(file_name, 'rb')
+		try:
+			header = file.read(TABLE_HEADER.size)
+			if len(header) != TABLE_HEADER.size:
+				raise RuntimeError('the header is incomplete')
+			finalized_flag, len_credit_maxes, len_vectors = TABLE_HEADER.unpack(header)
+			if finalized_flag not in (TABLE_FINALIZED, TABLE_FINALIZED_ALL_VECTORS):
+				raise RuntimeError('the table has not been completely computed')
+			len_credit_maxes += 1
+			len_vectors += 1
+
+			body = file.read(len_credit_maxes + len_vectors * (2 + len_credit_maxes))
+			if len(body) != len_credit_maxes + len_vectors * (2 + len_credit_maxes):
+				raise RuntimeError('the vectors are incomplete')
+			credit_maxes = tuple([x + 1 for x in body[:len_credit_maxes]])
+			rows = np.frombuffer(body, dtype = np.uint8, offset = len_credit_maxes).reshape(len_vectors, 2 + len_credit_maxes)
+			if not np.array_equal(rows[:, 0].astype(np.int64) * 256 + rows[:, 1], np.arange(len_vectors)):
+				raise RuntimeError('the vector ids are not 0, 1, 2, ...')
+			vectors_with_ids = tuple(enumerate(map(tuple, rows[:, 2:].tolist())))
+			if finalized_flag == TABLE_FINALIZED_ALL_VECTORS:
+				sorted_vectors = sorted([vector for id, vector in vectors_with_ids], reverse = True)
+				if remove_unneeded_vectors(credit_maxes, sorted_vectors) != sorted_vectors:
+					raise RuntimeError('the table was written by an older version whose last indices also count the vectors that are never needed; delete it to compute it again')
+
+			self.credit_maxes = credit_maxes
+			self.encoded_credit_maxes = vector_to_int(credit_maxes, credit_maxes)
+			self.table_offset = TABLE_HEADER.size + len(body)
+			# The checksum is optional, since files written before it was added do not have one
+			table_end = self.table_offset + (self.encoded_credit_maxes + 1) * 4
+			file_size = os.fstat(file.fileno()).st_size
+			if file_size not in (table_end, table_end + TABLE_CHECKSUM.size):
+				raise RuntimeError('the file has {:d} bytes instead of {:d}'.format(file_size, table_end + TABLE_CHECKSUM.size))
+			self.has_checksum = file_size == table_end + TABLE_CHECKSUM.size
+			self.table_end = table_end
+		except BaseException:
+			file.close()
+			raise
 
-	def init_empty_table(self, credit_maxes, vectors_with_ids):
+		self.vectors_with_ids = vectors_with_ids
+		self.vector_id_table = make_vector_id_table(vectors_with_ids)
+		self.file = file
+		self.initialized = True
+		self.finalized = True
+		self.map_entries()
+
+	# Return: True if the checksum of the file matches its contents, False if it does not, or None if the file has no checksum
+	def verify(self):
+		if not self.has_checksum:
+			return None
+		# The checksum is of every byte after the finalized flag
+		return file_checksum(self.mmap, 1, self.table_end) == TABLE_CHECKSUM.unpack_from(self.mmap, self.table_end)[0]
+
+	# Writes the whole file from a DenseTable computed in memory by algo2.build_table.
+	# The file is written front to back in large sequential writes, and the finalized flag is written last.
+	def write_table(self, credit_maxes, vectors_with_ids, dense_table):
 		if self.is_initialized():
 			raise RuntimeError
+		assert dense_table.credit_maxes == credit_maxes
 		self.credit_maxes = credit_maxes
-		self.vector_id_table = dict()
-		for id, vector in vectors_with_ids:
-			if vector not in self.vector_id_table:
-				self.vector_id_table[vector] = set()
-			self.vector_id_table[vector].add(id)
-		self.vector_id_table = {k: tuple(v) for k, v in self.vector_id_table.items()}
+		self.encoded_credit_maxes = vector_to_int(credit_maxes, credit_maxes)
+		self.vectors_with_ids = tuple(vectors_with_ids)
+		self.vector_id_table = make_vector_id_table(vectors_with_ids)
 		self.table_offset = 4 + len(credit_maxes) + len(vectors_with_ids) * (2 + len(credit_maxes))
-		self.table_keys = set()
 		
-		self.file.seek(0)
+		header = bytearray()
 		
 		# Write finalized flag
-		self.file.write(bytes([255]))
+		header += bytes([TABLE_UNFINISHED])
 	
 		# Write M
-		self.file.write((len(credit_maxes) - 1).to_bytes(1, byteorder='big', signed = False))
+		header += (len(credit_maxes) - 1).to_bytes(1, byteorder='big', signed = False)
 		
 		# Write N
-		self.file.write((len(vectors_with_ids) - 1).to_bytes(2, byteorder='big', signed = False))
+		header += (len(vectors_with_ids) - 1).to_bytes(2, byteorder='big', signed = False)
 		
 		# Write credit_maxes
-		for x in credit_maxes:
-			self.file.write((x - 1).to_bytes(1, byteorder='big', signed = False))
+		header += bytes([x - 1 for x in credit_maxes])
 		
 		# Write vectors
 		for i, (id, vector) in enumerate(vectors_with_ids):
 			assert i == id
-			self.file.write(id.to_bytes(2, byteorder='big', signed = False))
-			for x in vector:
-				self.file.write(x.to_bytes(1, byteorder='big', signed = False))
+			header += id.to_bytes(2, byteorder='big', signed = False)
+			header += bytes(vector)
 		
-		assert self.table_offset == self.file.tell()
+		assert self.table_offset == len(header)
+		self.file.seek(0)
+		self.file.write(header)
+		instrumentation.count('bytes_written', len(header))
+		checksum = zlib.crc32(header[1:])
 		
-		# Write all 0xFF to table - These values indicate unwritten to table if len(credit_maxes) != 1 << 8 or len(vectors_with_ids) != 1 << 16
-		for i in range(vector_to_int(credit_maxes, credit_maxes)):
-			for _ in range(4):
-				self.file.write(bytes([255]))
+		# Write table
+		# table[credit_maxes] is written as 0xFFFFFFFF.
+		assert not np.any(dense_table.sizes == dense_table.UNSEEN)
+		for chunk_start in range(0, self.encoded_credit_maxes + 1, TABLE_WRITE_CHUNK_STATES):
+			chunk_end = min(chunk_start + TABLE_WRITE_CHUNK_STATES, self.encoded_credit_maxes + 1)
+			entries = np.empty((chunk_end - chunk_start, 2), dtype = '>u2')
+			entries[:, 0] = dense_table.sizes[chunk_start:chunk_end].astype(np.uint16) - np.uint16(1)
+			entries[:, 1] = dense_table.last_indices[chunk_start:chunk_end]
+			if chunk_end == self.encoded_credit_maxes + 1:
+				entries[-1, 1] = 0xFFFF
+			entries = entries.tobytes()
+			self.file.write(entries)
+			checksum = zlib.crc32(entries, checksum)
+			instrumentation.count('bytes_written', len(entries))
+		self.file.write(TABLE_CHECKSUM.pack(checksum))
+		self.file.flush()
+		self.table_end = self.table_offset + (self.encoded_credit_maxes + 1) * 4
+		self.has_checksum = True
 		
 		self.initialized = True
 
-		# Write table[credit_maxes]
-		self.__setitem__(credit_maxes, None)
+		# Write finalized flag
+		self.file.seek(0)
+		self.file.write(bytes([TABLE_FINALIZED]))
+		self.finalized = True
+		self.map_entries()
+
+	# Views the table section of a finalized file as an array of big endian 2 byte unsigned integers.
+	# Lookups are then reads from memory instead of seeks and reads on the file, and processes that open the same file share its pages.
+	def map_entries(self):
+		self.file.flush()
+		self.mmap = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+		# entries[2 * key] and entries[2 * key + 1] are the two 2 byte values stored for key
+		self.entries = np.frombuffer(self.mmap, dtype = '>u2', count = (self.encoded_credit_maxes + 1) * 2, offset = self.table_offset)
 
-	def __setitem__(self, key, value):
-		if self.is_finalized():
-			raise RuntimeError
-		if not self.is_initialized():
-			raise RuntimeError
-		self.file.seek(self.table_offset + vector_to_int(self.credit_maxes, key) * 4)
-		if key == credit_maxes:
-			self.file.write(bytes([255]) * 4)
-		else:
-			self.file.write((value[0] - 1).to_bytes(2, byteorder='big', signed = False))
-			self.file.write(value[1].to_bytes(2, byteorder='big', signed = False))
-		self.table_keys.add(key)
-	
-	# TODO: Assert that key is a vector v such that 0 <= v and v <= self.credit_maxes
+	# TODO: Assert that key is an int k such that 0 <= k and k <= self.encoded_credit_maxes
 	def __contains__(self, key):
-		if not self.is_initialized():
+		if not self.is_finalized():
 			raise RuntimeError
-		if self.is_finalized():
-			return True
-		return key in self.table_keys
+		return True
 	
 	def __getitem__(self, key):
-		if not self.is_initialized():
+		if not self.is_finalized():
 			raise RuntimeError
-		if not self.__contains__(key):
-			raise RuntimeError
-		if key == self.credit_maxes:
+		if key == self.encoded_credit_maxes:
 			return (0, -1)
-
-		self.file.seek(self.table_offset + vector_to_int(self.credit_maxes, key) * (4))
-		value_0 = int.from_bytes(self.file.read(2), byteorder='big', signed = False) + 1
-		value_1 = int.from_bytes(self.file.read(2), byteorder='big', signed = False)
-		if value_0 > 1 << 14 and value_1 > 1 << 14:
-			print('here1')
-		return (value_0, value_1)
-	
-	def finalize(self):
-		if not self.is_initialized():
-			raise RuntimeError
-		self.file.seek(0)
-		self.file.write(bytes([0]))
-		del self.table_keys
-		self.finalized = True
+		return (self.entries.item(2 * key) + 1, self.entries.item(2 * key + 1))
 	
 	def is_finalized(self):
 		return self.finalized
@@ -216,12 +329,167 @@ class Table:
 			raise RuntimeError
 		return random.choice(self.vector_id_table[vector])
 
+	# Return: the sizes and last indices of all states as arrays indexed by encoded states, with table[credit_maxes] = (0, -1)
+	def dense_arrays(self):
+		entries = self.entries.reshape(-1, 2)
+		sizes = entries[:, 0].astype(np.int32) + 1
+		last_indices = entries[:, 1].astype(np.int32)
+		sizes[self.encoded_credit_maxes] = 0
+		last_indices[self.encoded_credit_maxes] = -1
+		return sizes, last_indices
+
+# A finalized table in the packed table file format, read-only. It has the same lookups as a finalized Table.
+# Raises RuntimeError if the file is not a finalized packed table file. verify is as in verify_table.
+class PackedTable:
+	def __init__(self, file_name, verify = 'no'):
+		self.checksum_ok = None
+		with open(file_name, 'rb') as file:
+			header = file.read(PACKED_TABLE_HEADER.size)
+			if len(header) != PACKED_TABLE_HEADER.size:
+				raise RuntimeError('{:s} is not a finalized packed table file'.format(file_name))
+			magic, version, M, N, P, W = PACKED_TABLE_HEADER.unpack(header)
+			if magic != PACKED_TABLE_MAGIC or version not in (1, PACKED_TABLE_VERSION) or not 1 <= W <= PACKED_TABLE_MAX_CODE_BITS:
+				raise RuntimeError('{:s} is not a finalized packed table file'.format(file_name))
+
+			body = file.read(M + N * M + P * 4)
+			if len(body) != M + N * M + P * 4:
+				raise RuntimeError('{:s} is not a complete packed table file'.format(file_name))
+			self.credit_maxes = tuple(body[:M])
+			self.encoded_credit_maxes = vector_to_int(self.credit_maxes, self.credit_maxes)
+			self.vectors_with_ids = tuple([(i, tuple(body[M + i * M:M + (i + 1) * M])) for i in range(N)])
+			self.vector_id_table = make_vector_id_table(self.vectors_with_ids)
+			palette = np.frombuffer(body, dtype = '<u2', count = P * 2, offset = M + N * M)
+			# palette[c] is the entry of code c
+			self.palette = list(zip(palette[:P].tolist(), palette[P:].tolist()))
+			self.code_bits = W
+			self.code_mask = (1 << W) - 1
+			self.codes_offset = PACKED_TABLE_HEADER.size + len(body)
+			self.codes_end = self.codes_offset + ((self.encoded_credit_maxes + 1) * W + 7) // 8
+			self.has_checksum = version >= 2
+
+			if os.fstat(file.fileno()).st_size != self.codes_end + UINT32.size:
+				raise RuntimeError('{:s} is not a complete packed table file'.format(file_name))
+			self.mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+		verify_table(self, verify, file_name)
+
+	# Return: True if the checksum of the file matches its contents, False if it does not, or None if the file has no checksum
+	def verify(self):
+		if not self.has_checksum:
+			return None
+		# The checksum is of every byte after the magic bytes
+		return file_checksum(self.mmap, len(PACKED_TABLE_MAGIC), self.codes_end) == UINT32.unpack_from(self.mmap, self.codes_end)[0]
+
+	def __contains__(self, key):
+		return True
+
+	def __getitem__(self, key):
+		if key == self.encoded_credit_maxes:
+			return (0, -1)
+		bit = key * self.code_bits
+		return self.palette[(UINT32.unpack_from(self.mmap, self.codes_offset + (bit >> 3))[0] >> (bit & 7)) & self.code_mask]
+
+	def is_finalized(self):
+		return True
+
+	def is_initialized(self):
+		return True
+
+	def vector_to_id(self, vector):
+		if vector not in self.vector_id_table:
+			raise RuntimeError
+		return random.choice(self.vector_id_table[vector])
+
+	# Return: the sizes and last indices of all states as arrays indexed by encoded states, with table[credit_maxes] = (0, -1)
+	def dense_arrays(self):
+		states = self.encoded_credit_maxes + 1
+		palette_sizes = np.array([size for size, last_index in self.palette], dtype = np.int32)
+		palette_last_indices = np.array([last_index for size, last_index in self.palette], dtype = np.int32)
+		sizes = np.empty(states, dtype = np.int32)
+		last_indices = np.empty(states, dtype = np.int32)
+		weights = (1 << np.arange(self.code_bits)).astype(np.int64)
+		# Chunks start at multiples of 8 states, which start at whole bytes
+		for chunk_start in range(0, states, TABLE_WRITE_CHUNK_STATES):
+			chunk_end = min(chunk_start + TABLE_WRITE_CHUNK_STATES, states)
+			first_byte = chunk_start * self.code_bits // 8
+			data = np.frombuffer(self.mmap, dtype = np.uint8, count = ((chunk_end - chunk_start) * self.code_bits + 7) // 8, offset = self.codes_offset + first_byte)
+			bits = np.unpackbits(data, bitorder = 'little')[:(chunk_end - chunk_start) * self.code_bits]
+			codes = bits.reshape(-1, self.code_bits) @ weights
+			sizes[chunk_start:chunk_end] = palette_sizes[codes]
+			last_indices[chunk_start:chunk_end] = palette_last_indices[codes]
+		sizes[self.encoded_credit_maxes] = 0
+		last_indices[self.encoded_credit_maxes] = -1
+		return sizes, last_indices
+
+# Writes a packed table file from the sizes and last indices of all states, as arrays indexed by encoded states
+# Return: the finalized PackedTable
+# The magic bytes are written last, so that a partly written file is not mistaken for a finalized one.
+# Raises RuntimeError instead of overwriting a file that can_overwrite_table_file does not allow.
+def write_packed_table(file_name, credit_maxes, vectors_with_ids, sizes, last_indices):
+	if not can_overwrite_table_file(file_name):
+		raise RuntimeError('{:s} is not a table file whose computation was interrupted, so it is not overwritten'.format(file_name))
+	encoded_credit_maxes = vector_to_int(credit_maxes, credit_maxes)
+	states = encoded_credit_maxes + 1
+	assert len(sizes) == states and len(last_indices) == states
+	assert len(credit_maxes) <= (1 << 8)
+	assert len(vectors_with_ids) <= (1 << 16)
+
+	# Entries as (size << 16) | last index. table[credit_maxes] takes the entry of state 0, since its code can be any value.
+	entries = (sizes.astype(np.uint32) << np.uint32(16)) | last_indices.astype(np.uint32)
+	entries[encoded_credit_maxes] = entries[0]
+	palette, codes = np.unique(entries, return_inverse = True)
+	codes = codes.reshape(-1)
+	del entries
+	assert len(palette) <= (1 << PACKED_TABLE_MAX_CODE_BITS)
+	W = max(1, (len(palette) - 1).bit_length())
+
+	if os.path.dirname(file_name) != '':
+		os.makedirs(os.path.dirname(file_name), exist_ok = True)
+	with open(file_name, 'w+b') as file:
+		header = bytearray(PACKED_TABLE_HEADER.pack(bytes(len(PACKED_TABLE_MAGIC)), PACKED_TABLE_VERSION, len(credit_maxes), len(vectors_with_ids), len(palette), W))
+		header += bytes(credit_maxes)
+		for i, (id, vector) in enumerate(vectors_with_ids):
+			assert i == id
+			header += bytes(vector)
+		header += (palette >> np.uint32(16)).astype('<u2').tobytes()
+		header += (palette & np.uint32(0xFFFF)).astype('<u2').tobytes()
+		file.write(header)
+		instrumentation.count('bytes_written', len(header))
+		checksum = zlib.crc32(header[len(PACKED_TABLE_MAGIC):])
+
+		# Chunks start at multiples of 8 states, which start at whole bytes
+		shifts = np.arange(W, dtype = codes.dtype)
+		for chunk_start in range(0, states, TABLE_WRITE_CHUNK_STATES):
+			chunk_end = min(chunk_start + TABLE_WRITE_CHUNK_STATES, states)
+			bits = ((codes[chunk_start:chunk_end, None] >> shifts) & 1).astype(np.uint8)
+			data = np.packbits(bits.reshape(-1), bitorder = 'little').tobytes()
+			file.write(data)
+			checksum = zlib.crc32(data, checksum)
+			instrumentation.count('bytes_written', len(data))
+		file.write(UINT32.pack(checksum))
+		file.flush()
+
+		file.seek(0)
+		file.write(PACKED_TABLE_MAGIC)
+
+	return PackedTable(file_name)
+
+# Return: the finalized table in file_name, a PackedTable or a Table depending on the format of the file. The file is opened read-only.
+# Raises RuntimeError if the file is not a finalized table file of either format, and OSError if it can not be read.
+# verify is as in verify_table.
+def open_table(file_name, verify = 'no'):
+	with open(file_name, 'rb') as file:
+		is_packed = file.read(len(PACKED_TABLE_MAGIC)) == PACKED_TABLE_MAGIC
+	if is_packed:
+		return PackedTable(file_name, verify)
+	return Table(file_name, create = False, verify = verify)
+
 # Input: the credit_maxes and vectors of the vector problem
 # Return: A function that takes as input a set of unfulfilled credits and returns a set of indices of vectors that fulfills those credits
 # TODO: Change return value to vectors selected or course codes selected.
-def make_query_function(credit_maxes, vectors, table_file_name):
-	start = time.time()
-
+# engine and processes are passed to algo2.build_table if the table file has to be computed.
+# If packed is True, a table file that has to be computed is written in the packed table file format. A finalized table file of either format is used as it is.
+# Raises RuntimeError without computing the table if table_file_name is neither a finalized table file nor a file that can_overwrite_table_file allows.
+def make_query_function(credit_maxes, vectors, table_file_name, engine = 'numpy', processes = 1, packed = False):
 	assert isinstance(credit_maxes, tuple), 'The credits vector was a non-tuple'
 	for x in credit_maxes:
 		assert isinstance(x, int), 'A credits value was a non-int'
@@ -242,167 +510,555 @@ def make_query_function(credit_maxes, vectors, table_file_name):
 			assert x == 0 or x == 1, 'A vector value was not 0 or 1'
 	
 	# These assertions ensure that the tables can be written to file.
-	# TODO: Write the part that writes dynamic programming table to file after computing the table.
 	assert len(credit_maxes) <= (1 << 8)
 	assert len(vectors) <= (1 << 16)
 	for x in credit_maxes:
 		assert 1 <= x
 		assert x <= 256
 
+	vectors_with_ids = list(enumerate(vectors))
+
 	max_nodes = 1
 	for x in credit_maxes:
 		max_nodes *= x + 1
 
-	# Sort vectors
-	vectors_with_ids = list(enumerate(vectors))
-	vectors = sorted(vectors, reverse = True)
-
-	table = Table(table_file_name)
+	try:
+		table = open_table(table_file_name)
+	except (OSError, RuntimeError) as e:
+		# A corrupt or stale file is refused before the table is computed, not after
+		if not can_overwrite_table_file(table_file_name):
+			raise RuntimeError('{:s} is not a table file whose computation was interrupted, so it is not overwritten: {!s:s}'.format(table_file_name, e)) from e
+		table = None
 
 	# Compute table if not already computed in provided table file
-	if not table.is_finalized():
-		storage_cost = 1 + 1 + 2 + len(credit_maxes) + len(vectors) * (2 + len(credit_maxes)) + max_nodes * 4
-		print('Writing tables to file will use {:d} bytes = {:.2f} KB = {:.2f} MB disk space.'.format(storage_cost, storage_cost / 1024, storage_cost / 1024 / 1024))
+	# The table is computed in memory and then written to the file all at once.
+	if table is None:
+		if not packed:
+			storage_cost = 1 + 1 + 2 + len(credit_maxes) + len(vectors_with_ids) * (2 + len(credit_maxes)) + max_nodes * 4 + TABLE_CHECKSUM.size
+			instrumentation.point('table file size', bytes = storage_cost)
 
-		table.init_empty_table(credit_maxes, vectors_with_ids)
+		dense_table = build_table(credit_maxes, remove_unneeded_vectors(credit_maxes, sorted(vectors, reverse = True)), engine, processes)
 
-		# Computation path priority queue
-		# We recurse on all sets of vectors in the standard order.
-		# new_queue holds the largest subsets (by size) to be recursed on.
-		new_queue = set()
-		new_queue.add(credit_maxes)
+		with instrumentation.span('writing tables to file', packed = packed):
+			table = write_table_file(table_file_name, credit_maxes, vectors_with_ids, dense_table, packed)
+		del dense_table
+		instrumentation.point('table file size', bytes = os.path.getsize(table_file_name))
 
-		# table[unfulfilled_credits] = min over all seen sets S of vectors that leave unfulfilled_credits unfulfilled of (len(S), S[-1])
-		# unfulfilled_credits == credit_maxes is an exception to the above statement. table[credit_maxes] = (0, -1)
-		table[credit_maxes] = (0, -1)
+	assert table.credit_maxes == credit_maxes, 'The table file was computed for a different problem'
+	assert table.vectors_with_ids == tuple(vectors_with_ids), 'The table file was computed for a different problem'
 
-		# Computation status
-		processed_nodes = 0
-		
-		right_bounds = [0] * len(credit_maxes)
-		i = 0
-		for j in range(len(credit_maxes)):
-			while i < len(vectors) and vectors[i][j] == 1:
-				i += 1
-			right_bounds[j] = i
-
-		# Computation loop
-		while len(new_queue) > 0:
-			# Progress priority queue
-			old_queue = new_queue
-			new_queue = set()
-			for credits_required in old_queue:
-				# Print computation status
-				if processed_nodes % 1000 == 0:
-					print('At least {:5.2f} % complete.'.format(processed_nodes / max_nodes * 100))
-				processed_nodes += 1
-
-				# Extract node from queue
-				assert not non_pos(credits_required)
-				len_selected_vectors, left_bound = table[credits_required]
-				left_bound += 1
-				assert (len_selected_vectors == 0) is (left_bound == 0)
-
-				# Add classes
-				for i in range(left_bound, len(vectors)):
-					# Add vector i to selected vectors
-					# Inlined vector_sub function call for slightly better performance
-					# new_credits_required = vector_sub(credits_required, vectors[i])
-					new_credits_required = tuple([a - b if a > b else 0 for a, b in zip(credits_required, vectors[i])])
-					new_set_values = (1 + len_selected_vectors, i)
-					
-					# Store minimal subsets in tables
-					if new_credits_required not in table or new_set_values < table[new_credits_required]:
-						table[new_credits_required] = new_set_values
-
-						# Recurse on minimal subsets
-						if not non_pos(new_credits_required):
-							new_queue.add(new_credits_required)
-
-		print('building dp tables required {:.2f} seconds'.format(time.time() - start))
-		start = time.time()
+	return make_table_query_function(table)
 
-		# table[unfulfilled_credits] stores values for subsets that leave at most unfulfilled_credits unfulfilled
-		def recurse(prefix):
-			if len(prefix) < len(credit_maxes):
-				for i in range(credit_maxes[len(prefix)] + 1):
-					recurse(prefix + [i])
-			else:
-				for i in range(len(credit_maxes)):
-					if 0 < prefix[i]:
-						# Same vector except ith place decremented
-						subvector = tuple([x - 1 if i == j else x for j, x in enumerate(prefix)])
-						assert subvector in table
-						tuple_prefix = tuple(prefix)
-						table_subvector = table[subvector]
-						if tuple_prefix not in table or table_subvector < table[tuple_prefix]:
-							table[tuple_prefix] = table_subvector
-		recurse([])
-
-		print('recursing through vector space required {:.2f} seconds'.format(time.time() - start))
-		start = time.time()
+# Input: a finalized Table or PackedTable, the vectors of the new vector problem and the file name to write the new table to
+# Return: A finalized table for the new vector problem, written to file_name in the same format.
+# Raises RuntimeError before updating the table if file_name is a file that can_overwrite_table_file does not allow.
+# The vectors added and removed are found by comparing the vectors of the table with vectors.
+# The old table is updated with one pass over the states per added vector. If vectors were removed, which is also the case for courses whose hub units changed,
+# the table is computed with one pass over the states per vector instead, see updated_dense_table.
+def update_table(table, vectors, file_name):
+	assert table.is_finalized()
+	credit_maxes = table.credit_maxes
+	for v in vectors:
+		assert len(v) == len(credit_maxes), 'Vectors differ in length'
+	assert len(vectors) <= (1 << 16)
+	if not can_overwrite_table_file(file_name):
+		raise RuntimeError('{:s} is not a table file whose computation was interrupted, so it is not overwritten'.format(file_name))
 
-		table.finalize()
+	old_vectors = remove_unneeded_vectors(credit_maxes, sorted([vector for id, vector in table.vectors_with_ids], reverse = True))
+	new_vectors = remove_unneeded_vectors(credit_maxes, sorted(vectors, reverse = True))
+	added = Counter(new_vectors) - Counter(old_vectors)
+	removed = Counter(old_vectors) - Counter(new_vectors)
+	with instrumentation.span('updating the table', added = sum(added.values()), removed = sum(removed.values()), rebuilt = len(removed) > 0):
+		dense_table = updated_dense_table(table, old_vectors, new_vectors, added, removed)
 
-	def vector_add(a, b):
-		return vector_sub(credit_maxes, vector_sub(vector_sub(credit_maxes, a), b))
-	
-	def query_helper(fulfilled_credits, selected_vectors):
+	with instrumentation.span('writing tables to file', packed = isinstance(table, PackedTable)):
+		return write_table_file(file_name, credit_maxes, list(enumerate(vectors)), dense_table, isinstance(table, PackedTable))
+
+# Writes dense_table, a DenseTable computed by algo2.build_table, to file_name, in the packed table file format if packed is True
+# Return: the finalized Table or PackedTable
+def write_table_file(file_name, credit_maxes, vectors_with_ids, dense_table, packed):
+	if packed:
+		return write_packed_table(file_name, credit_maxes, vectors_with_ids, dense_table.sizes, dense_table.last_indices)
+	table = Table(file_name)
+	table.write_table(credit_maxes, vectors_with_ids, dense_table)
+	return table
+
+# Return: the DenseTable of update_table, given the sorted vectors of the old and the new table and the vectors added and removed
+# If vectors were removed, the table is computed again by adding every new vector to the table of no vectors with add_vector_to_table,
+# since the table does not store the sizes of the sets that only use the vectors before a position, which are needed to take a vector out.
+# This is still several times faster than build_table.
+def updated_dense_table(table, old_vectors, new_vectors, added, removed):
+	credit_maxes = table.credit_maxes
+	dense_table = DenseTable(credit_maxes)
+	if len(removed) > 0:
+		# The table of no vectors, where only credit_maxes is completed
+		sizes = np.full(table.encoded_credit_maxes + 1, DenseTable.UNSEEN, dtype = np.int32)
+		last_indices = np.zeros(table.encoded_credit_maxes + 1, dtype = np.int32)
+		sizes[table.encoded_credit_maxes] = 0
+		last_indices[table.encoded_credit_maxes] = -1
+		vectors_so_far = []
+		added = Counter(new_vectors)
+	else:
+		sizes, last_indices = table.dense_arrays()
+		vectors_so_far = list(old_vectors)
+
+	for vector in sorted(added.elements(), reverse = True):
+		# The new vector goes after the vectors that are greater than or equal to it
+		position = 0
+		while position < len(vectors_so_far) and vectors_so_far[position] >= vector:
+			position += 1
+		vectors_so_far.insert(position, vector)
+		sizes, last_indices = add_vector_to_table(credit_maxes, sizes, last_indices, vector, position)
+		instrumentation.count('vectors_added')
+	assert vectors_so_far == new_vectors
+
+	assert np.all(sizes < DenseTable.UNSEEN)
+	dense_table.sizes[:] = sizes
+	last_indices[table.encoded_credit_maxes] = 0
+	dense_table.last_indices[:] = last_indices
+	return dense_table
+
+# Input: the sizes and last indices of a table (with table[credit_maxes] = (0, -1)) as arrays indexed by encoded states, and a vector that is inserted at position into the sorted vectors of the table
+# Return: the sizes and last indices of the table for the vectors with the new vector
+# A set for the new vectors either does not use the new vector, so it is a set for the old vectors whose indices from position on move up by one,
+# or it does, so the rest of it is a set for the old vectors that completes fulfilled_credits + vector.
+def add_vector_to_table(credit_maxes, sizes, last_indices, vector, position):
+	shape = tuple([x + 1 for x in credit_maxes])
+	last_indices = np.where(last_indices >= position, last_indices + 1, last_indices)
+
+	# Values at fulfilled_credits + vector, where each category stops at credit_maxes
+	next_sizes = sizes.reshape(shape)
+	next_last_indices = last_indices.reshape(shape)
+	for j, x in enumerate(credit_maxes):
+		if vector[j] == 1:
+			next_place = np.minimum(np.arange(x + 1) + 1, x)
+			next_sizes = np.take(next_sizes, next_place, axis = j)
+			next_last_indices = np.take(next_last_indices, next_place, axis = j)
+	with_sizes = next_sizes.reshape(-1) + 1
+	with_last_indices = np.maximum(next_last_indices.reshape(-1), position)
+
+	use_vector = (with_sizes < sizes) | ((with_sizes == sizes) & (with_last_indices < last_indices))
+	return np.where(use_vector, with_sizes, sizes), np.where(use_vector, with_last_indices, last_indices)
+
+# Input: a finalized Table or PackedTable
+# Return: The same function as make_query_function, using the credit_maxes and vectors stored in the table file
+def make_table_query_function(table):
+	assert table.is_finalized()
+
+	credit_maxes = table.credit_maxes
+	encoded_credit_maxes = table.encoded_credit_maxes
+
+	# Sort vectors
+	# These are the same sorted vectors that the table was computed with.
+	vectors = sorted([vector for id, vector in table.vectors_with_ids], reverse = True)
+	vectors = remove_unneeded_vectors(credit_maxes, vectors)
+
+	# States are vectors of unfulfilled credits encoded as ints by vector_to_int.
+	# This avoids building and hashing a tuple for every (state, vector) pair.
+	# vector_digits[i] is used to add vectors[i] to an encoded state.
+	vector_digits = [int_vector_digits(credit_maxes, v) for v in vectors]
+	class_of, class_starts, class_ends = vector_classes(vectors)
+
+	# fulfilled_credits is encoded by vector_to_int
+	# Returns (c, next_fulfilled_credits) for every distinct vector c that may be selected at fulfilled_credits and gets one vector closer to fulfilling credit_maxes.
+	# moves caches these per state, so that queries in the same batch that pass through the same states share the work.
+	def useful_moves(fulfilled_credits, moves):
+		if fulfilled_credits in moves:
+			return moves[fulfilled_credits]
+		size, left_bound = table[fulfilled_credits]
+		out = []
+		for c in range(class_of[left_bound], len(class_starts)):
+			next_fulfilled_credits = int_vector_add(fulfilled_credits, vector_digits[class_starts[c]])
+			if size > table[next_fulfilled_credits][0]:
+				out.append((c, next_fulfilled_credits))
+		moves[fulfilled_credits] = out
+		return out
+
+	# fulfilled_credits is encoded by vector_to_int
+	# moves is None or the cache of useful_moves
+	def query_helper(fulfilled_credits, selected_vectors, moves):
 		# Base case: All credits fulfilled
-		if fulfilled_credits == credit_maxes:
+		if fulfilled_credits == encoded_credit_maxes:
 			return selected_vectors
 
 		# Must select courses in order
 		right_bound = len(vectors)
 		if len(selected_vectors) > 0:
 			right_bound = selected_vectors[0]
+		if table[fulfilled_credits][1] >= right_bound:
+			return None
 		
 		# Randomly select a vector to add to the set
-		vec_indices = range(table[fulfilled_credits][1], right_bound)
-		vec_indices = list(vec_indices)
-		random.shuffle(vec_indices)
-		for i in vec_indices:
+		# Only the greatest copy of each distinct vector under right_bound is tried, since the sets found with smaller copies can also be found with it.
+		last_class = class_of[right_bound - 1]
+		if moves is None:
 			# Ignore vectors that do not lead closer to fulfilling credit_maxes
-			next_fulfilled_credits = vector_add(vectors[i], fulfilled_credits)
-			if table[fulfilled_credits][0] <= table[next_fulfilled_credits][0]: continue
-
+			size, left_bound = table[fulfilled_credits]
+			candidates = []
+			for c in range(class_of[left_bound], last_class + 1):
+				next_fulfilled_credits = int_vector_add(fulfilled_credits, vector_digits[class_starts[c]])
+				if size > table[next_fulfilled_credits][0]:
+					candidates.append((min(class_ends[c], right_bound) - 1, next_fulfilled_credits))
+		else:
+			candidates = [(min(class_ends[c], right_bound) - 1, next_fulfilled_credits) for c, next_fulfilled_credits in useful_moves(fulfilled_credits, moves) if c <= last_class]
+		random.shuffle(candidates)
+		for i, next_fulfilled_credits in candidates:
 			# Recurse to find the full set of vectors
-			res = query_helper(next_fulfilled_credits, [i] + selected_vectors)
+			res = query_helper(next_fulfilled_credits, [i] + selected_vectors, moves)
 			if res is not None:	return res
 
 		return None
 	
-	def query(fulfilled_credits):
+	def encode(fulfilled_credits):
 		assert isinstance(fulfilled_credits, tuple)
 		for x in fulfilled_credits:
 			assert isinstance(x, int)
 			assert 0 <= x
 		assert vector_le(fulfilled_credits, credit_maxes)
+		return vector_to_int(credit_maxes, fulfilled_credits)
 
-		res = query_helper(fulfilled_credits, [])
+	def answer(fulfilled_credits, moves):
+		encoded_fulfilled_credits = encode(fulfilled_credits)
+		res = query_helper(encoded_fulfilled_credits, [], moves)
 		
 		# Assert set is minimal
-		assert len(res) == table[fulfilled_credits][0]
+		assert len(res) == table[encoded_fulfilled_credits][0]
 		
 		# Output the indices of the vectors under the original order.
-		out = set()
-		for index in res:
-			y = table.vector_to_id(vectors[index])
-			while y in out:
-				y = table.vector_to_id(vectors[index])
-			out.add(y)
+		# Equal vectors are interchangeable, so a vector selected k times takes k distinct random ids of its copies.
+		out = []
+		for vector, copies in Counter([vectors[index] for index in res]).items():
+			out.extend(random.sample(table.vector_id_table[vector], copies))
+		return sorted(out)
+
+	# Returns a set of vector ids of minimal size that contains every id in include, no id in exclude and fulfills credit_maxes given fulfilled_credits.
+	# Returns None if there is no such set. Raises ValueError if include or exclude has an unknown vector id, or if a vector id is in both.
+	def query(fulfilled_credits, include = (), exclude = ()):
+		if len(include) == 0 and len(exclude) == 0:
+			return answer(fulfilled_credits, None)
+		return constrained_answer(fulfilled_credits, include, exclude)
+
+	def constrained_answer(fulfilled_credits, include, exclude):
+		include = set(include)
+		exclude = set(exclude)
+		for y in include | exclude:
+			if y not in vector_of_id:
+				raise ValueError('unknown vector id {!s:s}'.format(y))
+		if not include.isdisjoint(exclude):
+			raise ValueError('a vector id was both included and excluded')
+
+		# Included vectors are selected before the search starts
+		encoded_fulfilled_credits = encode(fulfilled_credits)
+		for y in include:
+			encoded_fulfilled_credits = int_vector_add(encoded_fulfilled_credits, int_vector_digits(credit_maxes, vector_of_id[y]))
+
+		# free_ids[c] are the ids of vector c that may still be selected and available[c] is the number of copies of it that may be selected
+		free_ids = [[y for y in sorted_vector_ids[vectors[class_starts[c]]] if y not in include and y not in exclude] for c in range(len(class_starts))]
+		available = [min(class_ends[c] - class_starts[c], len(free_ids[c])) for c in range(len(class_starts))]
+
+		# No set exists if selecting every available vector does not fulfill credit_maxes
+		everything = encoded_fulfilled_credits
+		for c in range(len(class_starts)):
+			for _ in range(available[c]):
+				everything = int_vector_add(everything, vector_digits[class_starts[c]])
+		if everything != encoded_credit_maxes:
+			return None
+
+		# The table only knows about the unconstrained problem, so table[state][0] is a lower bound on the number of vectors the constrained problem still needs.
+		# Iterative deepening on the number of vectors: the first budget with a set has a set of minimal size.
+		failed = set()
+		budget = table[encoded_fulfilled_credits][0]
+		while True:
+			res = constrained_helper(encoded_fulfilled_credits, budget, len(class_starts) - 1, 0, available, failed)
+			if res is not None:
+				break
+			budget += 1
+
+		out = set(include)
+		for c in set(res):
+			out.update(random.sample(free_ids[c], res.count(c)))
 		return sorted(out)
 
+	# fulfilled_credits is encoded by vector_to_int
+	# Returns the list of distinct vectors of a set of at most budget vectors that completes fulfilled_credits, or None.
+	# Distinct vectors are selected in decreasing order: only distinct vectors up to last_class may be selected, of which used copies of last_class were selected already.
+	# failed holds the arguments of calls that returned None.
+	def constrained_helper(fulfilled_credits, budget, last_class, used, available, failed):
+		# Base case: All credits fulfilled
+		if fulfilled_credits == encoded_credit_maxes:
+			return []
+		if table[fulfilled_credits][0] > budget:
+			return None
+		key = (fulfilled_credits, budget, last_class, used)
+		if key in failed:
+			return None
+
+		candidates = list(range(last_class + 1))
+		random.shuffle(candidates)
+		for c in candidates:
+			next_used = used + 1 if c == last_class else 1
+			if next_used > available[c]:
+				continue
+			next_fulfilled_credits = int_vector_add(fulfilled_credits, vector_digits[class_starts[c]])
+			if next_fulfilled_credits == fulfilled_credits or table[next_fulfilled_credits][0] >= budget:
+				continue
+			res = constrained_helper(next_fulfilled_credits, budget - 1, c, next_used, available, failed)
+			if res is not None:
+				res.append(c)
+				return res
+
+		failed.add(key)
+		return None
+
+	# Lazily yields query(x) for each x in fulfilled_credits_iterable.
+	# Equal inputs get the same answer, which is only computed once while it is one of the QUERY_MANY_MAX_ANSWERS most recently used.
+	# The memory used is bounded by QUERY_MANY_MAX_ANSWERS and QUERY_MANY_MAX_MOVE_STATES, no matter how many inputs there are.
+	def query_many(fulfilled_credits_iterable):
+		moves = dict()
+		answers = OrderedDict()
+		for fulfilled_credits in fulfilled_credits_iterable:
+			if fulfilled_credits in answers:
+				answers.move_to_end(fulfilled_credits)
+			else:
+				if len(moves) >= QUERY_MANY_MAX_MOVE_STATES:
+					moves.clear()
+				answers[fulfilled_credits] = answer(fulfilled_credits, moves)
+				if len(answers) > QUERY_MANY_MAX_ANSWERS:
+					answers.popitem(last = False)
+			yield list(answers[fulfilled_credits])
+
+	# fulfilled_credits is encoded by vector_to_int
+	# Returns (c, next_fulfilled_credits) for every distinct vector c that fulfills more credits at fulfilled_credits.
+	def advancing_moves(fulfilled_credits, moves):
+		if fulfilled_credits in moves:
+			return moves[fulfilled_credits]
+		out = []
+		for c in range(len(class_starts)):
+			next_fulfilled_credits = int_vector_add(fulfilled_credits, vector_digits[class_starts[c]])
+			if next_fulfilled_credits != fulfilled_credits:
+				out.append((c, next_fulfilled_credits))
+		moves[fulfilled_credits] = out
+		return out
+
+	# fulfilled_credits is encoded by vector_to_int
+	# Yields the index lists, in the order the vectors are selected, of all sets of exactly budget more vectors that complete path at fulfilled_credits.
+	# Distinct vectors are selected in decreasing order, and each selection takes the greatest copy of the vector that is not selected yet.
+	# The sets are yielded in increasing lexicographical order of their index lists, and sets that only differ in which copies of a vector they select are yielded once.
+	# If after is not None, only the sets whose index lists come after after are yielded.
+	# table[state][0] is a lower bound on the vectors that complete state without the vectors in path, so states that need more than the remaining budget are not expanded.
+	# table[state][1] is not used: it is the last index of one minimal set, and other minimal sets may end before it.
+	def enumerate_helper(fulfilled_credits, budget, path, after, moves):
+		# Base case: All credits fulfilled
+		if fulfilled_credits == encoded_credit_maxes:
+			if after is None and budget == 0:
+				yield list(path)
+			return
+		if table[fulfilled_credits][0] > budget:
+			return
+
+		# Must select courses in order
+		right_bound = len(vectors)
+		if len(path) > 0:
+			right_bound = path[-1]
+		if right_bound == 0:
+			return
+
+		last_class = class_of[right_bound - 1]
+		for c, next_fulfilled_credits in advancing_moves(fulfilled_credits, moves):
+			if c > last_class:
+				break
+			if table[next_fulfilled_credits][0] >= budget:
+				continue
+			i = min(class_ends[c], right_bound) - 1
+			next_after = None
+			if after is not None:
+				if i < after[len(path)]:
+					continue
+				if i == after[len(path)]:
+					next_after = after
+			path.append(i)
+			yield from enumerate_helper(next_fulfilled_credits, budget - 1, path, next_after, moves)
+			path.pop()
+
+	# Output the indices of the vectors under the original order.
+	# Copies of a vector are mapped to its ids in increasing order, so the output is the same every time.
+	def path_to_ids(path):
+		return sorted([sorted_vector_ids[vectors[i]][i - class_starts[class_of[i]]] for i in path])
+
+	# Yields (vector ids, cursor) for all minimal sets that fulfill credit_maxes given fulfilled_credits, each exactly once and always in the same order.
+	# If cursor is the cursor of a set yielded before, only the sets after that set are yielded.
+	def query_all(fulfilled_credits, cursor = None):
+		encoded_fulfilled_credits = encode(fulfilled_credits)
+		after = None if cursor is None else parse_cursor(encoded_fulfilled_credits, cursor)
+
+		for path in enumerate_helper(encoded_fulfilled_credits, table[encoded_fulfilled_credits][0], [], after, dict()):
+			yield path_to_ids(path), '{:d}:{:s}'.format(encoded_fulfilled_credits, '.'.join(map(str, path)))
+
+	# Returns (list of at most page_size lists of vector ids, cursor for the next page) of the minimal sets after cursor.
+	# The returned cursor is None if there are no more sets.
+	def query_page(fulfilled_credits, page_size, cursor = None):
+		assert 1 <= page_size
+		page = []
+		next_cursor = None
+		for vector_ids, next_cursor in query_all(fulfilled_credits, cursor):
+			page.append(vector_ids)
+			if len(page) == page_size:
+				break
+		if len(page) < page_size:
+			next_cursor = None
+		return page, next_cursor
+
+	# Raises ValueError if cursor was not returned by query_all with the same fulfilled_credits
+	def parse_cursor(encoded_fulfilled_credits, cursor):
+		try:
+			encoded, path = cursor.split(':')
+			path = [int(x) for x in path.split('.')] if len(path) > 0 else []
+		except (AttributeError, ValueError):
+			raise ValueError('invalid cursor')
+		if int(encoded) != encoded_fulfilled_credits or len(path) != table[encoded_fulfilled_credits][0]:
+			raise ValueError('cursor is for a different query')
+		for x in path:
+			if x < 0 or x >= len(vectors):
+				raise ValueError('invalid cursor')
+		return path
+
+	# Yields the vector ids of sets of at most table[fulfilled_credits][0] + k vectors that fulfill credit_maxes given fulfilled_credits.
+	# Only sets from which no vector can be removed are yielded, since any set can be made larger by adding vectors to it.
+	# Smaller sets are yielded first. Sets of the same size are yielded in a fixed order, or in a random order if randomize is True, so that stopping early gives a random sample.
+	def query_near(fulfilled_credits, k, randomize = False):
+		assert 0 <= k
+		encoded_fulfilled_credits = encode(fulfilled_credits)
+		size = table[encoded_fulfilled_credits][0]
+		for budget in range(size, size + k + 1):
+			for classes in near_helper(encoded_fulfilled_credits, budget, len(class_starts) - 1, 0, [], randomize):
+				if is_irredundant(encoded_fulfilled_credits, classes):
+					yield path_to_ids([class_starts[c] + classes[:j].count(c) for j, c in enumerate(classes)])
+
+	# fulfilled_credits is encoded by vector_to_int
+	# Yields the lists of distinct vectors of all sets of exactly budget more vectors that complete fulfilled_credits after selected.
+	# Distinct vectors are selected in decreasing order: only distinct vectors up to last_class may be selected, of which used copies of last_class were selected already.
+	# table[state][0] is the least number of vectors that completes state, so states that need more than the remaining budget are not expanded.
+	def near_helper(fulfilled_credits, budget, last_class, used, selected, randomize):
+		# Base case: All credits fulfilled
+		if fulfilled_credits == encoded_credit_maxes:
+			if budget == 0:
+				yield list(selected)
+			return
+		if table[fulfilled_credits][0] > budget:
+			return
+
+		candidates = list(range(last_class + 1))
+		if randomize:
+			random.shuffle(candidates)
+		for c in candidates:
+			next_used = used + 1 if c == last_class else 1
+			if next_used > class_ends[c] - class_starts[c]:
+				continue
+			# Vectors that fulfill nothing more can always be removed
+			next_fulfilled_credits = int_vector_add(fulfilled_credits, vector_digits[class_starts[c]])
+			if next_fulfilled_credits == fulfilled_credits:
+				continue
+			selected.append(c)
+			yield from near_helper(next_fulfilled_credits, budget - 1, c, next_used, selected, randomize)
+			selected.pop()
+
+	# Returns whether every vector in classes is needed to complete fulfilled_credits
+	def is_irredundant(fulfilled_credits, classes):
+		for j in range(len(classes)):
+			if j > 0 and classes[j] == classes[j - 1]:
+				continue
+			without = fulfilled_credits
+			for l, c in enumerate(classes):
+				if l != j:
+					without = int_vector_add(without, vector_digits[class_starts[c]])
+			if without == encoded_credit_maxes:
+				return False
+		return True
+
+	sorted_vector_ids = {k: sorted(v) for k, v in table.vector_id_table.items()}
+	vector_of_id = dict(table.vectors_with_ids)
+
+	query.query_many = query_many
+	query.query_all = query_all
+	query.query_page = query_page
+	query.query_near = query_near
 	return query
 
+# Input: a value from a JSON request and the credit_maxes of the table
+# Return: the value as a fulfilled_credits tuple. Raises ValueError if the value is not a valid fulfilled_credits.
+def parse_fulfilled_credits(value, credit_maxes):
+	if not isinstance(value, list) or len(value) != len(credit_maxes):
+		raise ValueError('fulfilled_credits must be a list of {:d} ints'.format(len(credit_maxes)))
+	for x, y in zip(value, credit_maxes):
+		if not isinstance(x, int) or isinstance(x, bool) or x < 0 or x > y:
+			raise ValueError('fulfilled_credits must be between 0 and {!s:s}'.format(list(credit_maxes)))
+	return tuple(value)
+
+# Reads one JSON query per line from input_file and writes one JSON answer per line to output_file.
+# A query is either a fulfilled_credits list or an object {"id": ..., "fulfilled_credits": [...]}.
+# An answer is {"id": ..., "result": [...]} or {"id": ..., "error": "..."}, where "id" is only present if the query had one.
+def answer_jsonl(table_file_name, input_file, output_file):
+	table = open_table(table_file_name)
+	query = make_table_query_function(table)
+
+	# query_many pulls exactly one input per answer, so each valid line is put here right before its answer is pulled.
+	pending = deque()
+	def pending_inputs():
+		while True:
+			yield pending.popleft()
+	answers = query.query_many(pending_inputs())
+
+	for line in input_file:
+		if len(line.strip()) == 0:
+			continue
+		request = None
+		try:
+			request = json.loads(line)
+			value = request.get('fulfilled_credits') if isinstance(request, dict) else request
+			pending.append(parse_fulfilled_credits(value, table.credit_maxes))
+			response = {'result': next(answers)}
+		except ValueError as e:
+			response = {'error': str(e)}
+		if isinstance(request, dict) and 'id' in request:
+			response['id'] = request['id']
+		output_file.write(json.dumps(response) + '\n')
+
+# Input: the file name of a finalized table
+# Return: The same function as make_query_function, without needing the vector problem file
+def load_query_function(table_file_name):
+	return make_table_query_function(open_table(table_file_name))
+
 if __name__ == '__main__':
-	if len(sys.argv) != 2:
+	if len(sys.argv) == 3 and sys.argv[1] == '--jsonl':
+		answer_jsonl(sys.argv[2], sys.stdin, sys.stdout)
+	elif len(sys.argv) == 5 and sys.argv[1] == '--update':
+		instrumentation.report_to_terminal()
+		credit_maxes, unsorted_vectors = read_problem(sys.argv[3])
+		table = open_table(sys.argv[2])
+		assert table.credit_maxes == credit_maxes, 'The table file was computed for a different problem'
+		update_table(table, unsorted_vectors, sys.argv[4])
+	elif len(sys.argv) == 4 and sys.argv[1] == '--pack':
+		instrumentation.report_to_terminal()
+		table = open_table(sys.argv[2])
+		with instrumentation.span('writing tables to file', packed = True):
+			write_packed_table(sys.argv[3], table.credit_maxes, table.vectors_with_ids, *table.dense_arrays())
+		instrumentation.point('table file size', bytes = os.path.getsize(sys.argv[3]), unpacked_bytes = os.path.getsize(sys.argv[2]))
+	elif len(sys.argv) != 2:
 		print('Usage:')
 		print()
 		print('python3 {:s} filename'.format(__file__))
+		print('python3 {:s} --jsonl table_file_name < queries.jsonl > answers.jsonl'.format(__file__))
+		print('python3 {:s} --update old_table_file_name filename new_table_file_name'.format(__file__))
+		print('python3 {:s} --pack table_file_name packed_table_file_name'.format(__file__))
 	else:
+		instrumentation.report_to_terminal()
 		credit_maxes, unsorted_vectors = read_problem(sys.argv[1])
-		query = make_query_function(credit_maxes, unsorted_vectors, 'Solution/{:s}/{:s}'.format(__file__[:__file__.rfind('.')], os.path.basename(sys.argv[1])))
+		table_file_name = 'Solution/{:s}/{:s}'.format(__file__[:__file__.rfind('.')], os.path.basename(sys.argv[1]))
+		query = make_query_function(credit_maxes, unsorted_vectors, table_file_name)
+
+		# Keep the course index of the problem next to the table, so that query_server.py finds it
+		if os.path.exists(course_index_file_name(sys.argv[1])) and course_index_file_name(sys.argv[1]) != course_index_file_name(table_file_name):
+			shutil.copyfile(course_index_file_name(sys.argv[1]), course_index_file_name(table_file_name))
 
 		start = time.time()
 		for i in range(1 << 14):
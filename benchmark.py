@@ -0,0 +1,212 @@
+'''
+Reproducible benchmarks of algo.py, algo2.py and algo3.py.
+
+The vector problems are generated from a seed with the same credit_maxes as the problems in PROBLEM_PARAMETERS, so the results do not depend on the BU course search page.
+Each (problem, algorithm) pair runs in a fresh process so that its peak memory is measured on its own.
+
+Run this file by running `python benchmark.py` in terminal. See --help for the options.
+The results are written as JSON. Every timed phase is compared with a baseline results file, by default the committed DEFAULT_BASELINE,
+and the program exits with status 1 if a phase got slower by more than the tolerance.
+To update the baseline, run `python benchmark.py --output benchmark_baseline.json --baseline ""` on an otherwise idle machine.
+'''
+
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from constants import PROBLEM_PARAMETERS
+import instrumentation
+from instrumentation import peak_rss_bytes
+from download_problems import remove_excess_vectors, write_problem_file
+
+ALGORITHMS = ('algo', 'algo2', 'algo3')
+DEFAULT_SHAPES = ('T0', 'F6', 'F5', 'F4')
+DEFAULT_COURSES = 400
+DEFAULT_QUERIES = 1 << 12
+DEFAULT_TOLERANCE = 0.25
+# Results of the default options committed with the code, which runs are compared with unless --baseline says otherwise
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# Spans of algo2.build_table -> the phase that their seconds are added to
+# The build phase is the whole build_table call, and these are its parts.
+BUILD_SPAN_PHASES = {
+	'building dp tables': 'search',
+	'recursing through vector space': 'closure',
+	'expanding merged table': 'expand',
+}
+
+# Phases shorter than this in both runs are not compared, since their times are mostly noise
+MIN_COMPARED_SECONDS = 0.05
+
+# Probability that a generated course fulfills 1, 2, 3 or 4 hub units
+UNITS_PER_COURSE_WEIGHTS = (0.45, 0.35, 0.15, 0.05)
+
+# shape name -> credit_maxes, for example 'F4' for the problem written to Problem/F4.txt
+SHAPES = {os.path.splitext(os.path.basename(file_name))[0]: credit_maxes for file_name, hub_columns, credit_maxes in PROBLEM_PARAMETERS}
+
+# Return: the vectors of a random vector problem with the given credit_maxes, the same every time for the same arguments
+# Each of the courses fulfills a random set of hub units. Extra copies of a vector are removed the same way as in write_problem.
+def generate_problem(credit_maxes, seed, courses = DEFAULT_COURSES):
+	rng = random.Random(seed)
+	vectors = []
+	for _ in range(courses):
+		units = rng.choices(range(1, len(UNITS_PER_COURSE_WEIGHTS) + 1), weights = UNITS_PER_COURSE_WEIGHTS)[0]
+		vector = [0] * len(credit_maxes)
+		for j in rng.sample(range(len(credit_maxes)), min(units, len(credit_maxes))):
+			vector[j] = 1
+		vectors.append(tuple(vector))
+	return tuple(remove_excess_vectors(credit_maxes, vectors))
+
+def count_states(credit_maxes):
+	states = 1
+	for x in credit_maxes:
+		states *= x + 1
+	return states
+
+# Returns the seconds that func() took and the value it returned
+def timed(func):
+	start = time.perf_counter()
+	value = func()
+	return time.perf_counter() - start, value
+
+# Runs one algorithm on one problem and returns its result entry.
+# This runs in its own process, and the algorithms' progress output is discarded.
+def run_case(shape, algorithm, credit_maxes, vectors, queries, seed):
+	# Imported here so that the parent process does not pay for them
+	import algo
+	import algo2
+	import algo3
+
+	random.seed(seed)
+	rng = random.Random(seed)
+	random_queries = [tuple([rng.randint(0, x) for x in credit_maxes]) for _ in range(queries)]
+
+	phases = dict()
+	table_bytes = None
+	merged_states = None
+	with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+		if algorithm == 'algo':
+			# algo.py computes its tables and answers only the query where nothing is fulfilled yet
+			phases['build'], query = timed(lambda: algo.make_query_function(credit_maxes, vectors))
+			phases['queries'], _ = timed(lambda: [query() for _ in range(queries)])
+		else:
+			sorted_vectors = algo2.remove_unneeded_vectors(credit_maxes, sorted(vectors, reverse = True))
+			# The parts of the build are taken from its spans, so that the build runs exactly as in make_query_function
+			events = []
+			previous_reporter, previous_sample_memory = instrumentation.reporter, instrumentation.sample_memory
+			instrumentation.set_reporter(events.append)
+			phases['build'], table = timed(lambda: algo2.build_table(credit_maxes, sorted_vectors))
+			instrumentation.set_reporter(previous_reporter, previous_sample_memory)
+			for event in events:
+				if event['event'] == 'span' and event['name'] in BUILD_SPAN_PHASES:
+					phase = BUILD_SPAN_PHASES[event['name']]
+					phases[phase] = phases.get(phase, 0.0) + event['seconds']
+				elif event['name'] == 'merged categories':
+					merged_states = event['merged_states']
+			if algorithm == 'algo2':
+				table_bytes = table.sizes.nbytes + table.last_indices.nbytes
+				query = algo2.make_query_function(credit_maxes, vectors, table = table)
+				phases['queries'], _ = timed(lambda: [query(x) for x in random_queries])
+			else:
+				with tempfile.TemporaryDirectory() as directory:
+					file_name = os.path.join(directory, shape)
+					file_table = algo3.Table(file_name)
+					phases['finalize'], _ = timed(lambda: file_table.write_table(credit_maxes, list(enumerate(vectors)), table))
+					del table
+					table_bytes = os.path.getsize(file_name)
+					query = algo3.make_table_query_function(file_table)
+					phases['queries'], _ = timed(lambda: [query(x) for x in random_queries])
+
+	states = count_states(credit_maxes)
+	return {
+		'shape': shape,
+		'algorithm': algorithm,
+		'states': states,
+		'merged_states': merged_states,
+		'vectors': len(vectors),
+		'queries': queries,
+		'phases': phases,
+		'states_per_second': states / phases['build'] if phases['build'] > 0 else None,
+		'peak_rss_bytes': peak_rss_bytes(),
+		'table_bytes': table_bytes,
+	}
+
+# Return: a list of (shape, algorithm, phase, baseline seconds, seconds) for every phase that got slower by more than tolerance
+def find_regressions(results, baseline, tolerance):
+	baseline_entries = {(x['shape'], x['algorithm']): x for x in baseline['results']}
+	regressions = []
+	for entry in results['results']:
+		old_entry = baseline_entries.get((entry['shape'], entry['algorithm']))
+		if old_entry is None:
+			continue
+		for phase, seconds in entry['phases'].items():
+			old_seconds = old_entry['phases'].get(phase)
+			if old_seconds is None or max(seconds, old_seconds) < MIN_COMPARED_SECONDS:
+				continue
+			print('{:4s} {:6s} {:10s} {:9.3f} s -> {:9.3f} s ({:+.0f} %)'.format(entry['shape'], entry['algorithm'], phase, old_seconds, seconds, (seconds / old_seconds - 1) * 100 if old_seconds > 0 else float('inf')))
+			if seconds > old_seconds * (1 + tolerance):
+				regressions.append((entry['shape'], entry['algorithm'], phase, old_seconds, seconds))
+	return regressions
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Benchmarks the algorithms on generated vector problems.')
+	parser.add_argument('--shapes', nargs = '+', default = DEFAULT_SHAPES, choices = sorted(SHAPES), help = 'problems of PROBLEM_PARAMETERS to take the credit_maxes from')
+	parser.add_argument('--algorithms', nargs = '+', default = ALGORITHMS, choices = ALGORITHMS)
+	parser.add_argument('--seed', type = int, default = 0)
+	parser.add_argument('--courses', type = int, default = DEFAULT_COURSES, help = 'number of courses generated per problem before extra copies are removed')
+	parser.add_argument('--queries', type = int, default = DEFAULT_QUERIES)
+	parser.add_argument('--output', default = 'benchmark_results.json')
+	parser.add_argument('--baseline', default = DEFAULT_BASELINE, help = 'results file to compare with, or an empty string to not compare')
+	parser.add_argument('--tolerance', type = float, default = DEFAULT_TOLERANCE, help = 'fraction that a phase may get slower by before it counts as a regression')
+	parser.add_argument('--write-problems', metavar = 'DIRECTORY', help = 'also write the generated problems as vector problem files')
+	args = parser.parse_args()
+
+	results = {
+		'date generated': str(datetime.datetime.now()),
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'machine': platform.machine(),
+		'seed': args.seed,
+		'courses': args.courses,
+		'results': [],
+	}
+
+	context = multiprocessing.get_context('spawn')
+	for shape in args.shapes:
+		credit_maxes = SHAPES[shape]
+		vectors = generate_problem(credit_maxes, args.seed, args.courses)
+		if args.write_problems is not None:
+			write_problem_file(os.path.join(args.write_problems, shape + '.txt'), ['generated by benchmark.py with seed {:d} and {:d} courses'.format(args.seed, args.courses)], credit_maxes, vectors)
+
+		for algorithm in args.algorithms:
+			with context.Pool(1) as pool:
+				entry = pool.apply(run_case, (shape, algorithm, credit_maxes, vectors, args.queries, args.seed))
+			results['results'].append(entry)
+			print('{:4s} {:6s} {:9d} states {:4d} vectors  {:s}  peak {:.1f} MB'.format(shape, algorithm, entry['states'], entry['vectors'], '  '.join(['{:s} {:.3f} s'.format(k, v) for k, v in entry['phases'].items()]), entry['peak_rss_bytes'] / 1024 / 1024))
+
+	with open(args.output, 'w') as f:
+		json.dump(results, f, indent = '\t')
+	print('wrote {:s}'.format(args.output))
+
+	if args.baseline != '':
+		with open(args.baseline, 'r') as f:
+			baseline = json.load(f)
+		# Times of different problems or machines say nothing about regressions
+		for key in ('seed', 'courses', 'machine'):
+			if baseline.get(key) != results[key]:
+				print('warning: the baseline has {:s} {!s:s} instead of {!s:s}'.format(key, baseline.get(key), results[key]))
+		regressions = find_regressions(results, baseline, args.tolerance)
+		if len(regressions) > 0:
+			print('{:d} phases got slower by more than {:.0f} %'.format(len(regressions), args.tolerance * 100))
+			sys.exit(1)
+		print('no regressions')
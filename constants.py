@@ -5,6 +5,17 @@ ALL_SEMESTER_CODES = ['2020-FALL', '2020-SUMM', '*']
 REQUEST_HOST = 'www.bu.edu'
 REQUEST_URL = 'https://www.bu.edu/phpbin/course-search/search.php'
 REQUEST_DEFAULT_TIMEOUT_IN_SECONDS = 10
+# Number of pages of the search page downloaded at the same time
+REQUEST_CONCURRENCY = 8
+# A failed request is tried again up to REQUEST_RETRIES times, waiting REQUEST_BACKOFF_FACTOR * 2 ** (retry number - 1) seconds before each retry
+REQUEST_RETRIES = 4
+REQUEST_BACKOFF_FACTOR = 0.5
+# Pages are downloaded and read in chunks of this size, so that a whole page is never kept in memory
+REQUEST_CHUNK_SIZE_IN_BYTES = 1 << 16
+# Downloaded pages are kept in REQUEST_CACHE_DIRECTORY, compressed. See request_courses_cached in download_problems.py.
+REQUEST_CACHE_DIRECTORY = 'Cache'
+# A cached page is used without asking the search page if it was downloaded or revalidated less than this many seconds ago
+REQUEST_CACHE_MAX_AGE_IN_SECONDS = 24 * 60 * 60
 
 # Elements of PROBLEM_PARAMETERS are tuples of length 3.
 # The first element is the file name to write the problem to.
@@ -30,5 +41,5 @@ PROBLEM_PARAMETERS += [('Problem/F5.txt', [(x,) for x in 'ABCDE'] + [('F', 'P')]
 PROBLEM_PARAMETERS += [('Problem/F6.txt', [(x,) for x in 'ABCDE'] + [('F', 'P')] + [(x,) for x in 'GHIKLMNO'], (1,) * 14)]
 
 '''
-There are constants in request_courses and read_downloaded_html in download_problems.py, but these likely do not need to be changed frequently.
+There are constants in request_courses and above read_downloaded_html in download_problems.py, but these likely do not need to be changed frequently.
 '''
\ No newline at end of file
@@ -0,0 +1,136 @@
+'''
+Course index file format:
+
+A course index lists the courses that each vector of a vector problem stands for, so that the vector ids returned by the algorithms can be turned into course codes.
+write_problem in download_problems.py writes one next to every vector problem file, named by course_index_file_name.
+Integers are little endian unsigned integers of 4 bytes.
+
+COURSE_INDEX_HEADER:
+	8 bytes: COURSE_INDEX_MAGIC
+	version: COURSE_INDEX_VERSION
+	fingerprint: problem_fingerprint of the vector problem, so that an index is not used with another problem
+	N: the number of vectors
+	C: the number of courses
+	S: the number of bytes of strings
+N + 1 integers: vector starts. The courses of the vector with id i are the courses numbered vector starts[i] to vector starts[i + 1] - 1.
+3 * C + 1 integers: string starts. String k is bytes string starts[k] to string starts[k + 1] of the strings. The code, title and credits of course j are strings 3 * j, 3 * j + 1 and 3 * j + 2.
+S bytes: the strings, utf-8 encoded.
+
+If there are more courses with the same vector than copies of the vector in the problem, the courses are split between the copies, so no course belongs to two vector ids.
+Any one course of each vector id in a set of vector ids can then be taken together.
+'''
+
+import os
+import struct
+import mmap
+import zlib
+
+COURSE_INDEX_MAGIC = b'CRSINDEX'
+COURSE_INDEX_VERSION = 1
+COURSE_INDEX_HEADER = struct.Struct('<8sIIIII')
+COURSE_INDEX_EXTENSION = '.courses'
+
+# Number of strings stored per course: code, title and credits
+STRINGS_PER_COURSE = 3
+
+UINT32 = struct.Struct('<I')
+UINT32_PAIR = struct.Struct('<II')
+
+# Return: the name of the course index file for the vector problem or table file file_name
+def course_index_file_name(file_name):
+	return os.path.splitext(file_name)[0] + COURSE_INDEX_EXTENSION
+
+# Return: an integer that changes when credit_maxes or vectors change
+def problem_fingerprint(credit_maxes, vectors):
+	fingerprint = zlib.crc32(bytes(credit_maxes))
+	return zlib.crc32(bytes([x for vec in vectors for x in vec]), fingerprint)
+
+# Input: the sorted vectors of a vector problem, as returned by remove_excess_vectors, and a dict from each course to its vector
+# Return: a list with the list of courses of each vector id
+# Courses are (code, title, credits) tuples. The courses of equal vectors are dealt out to their copies in sorted order.
+def courses_of_vector_ids(vectors, course_to_vector):
+	courses_of_vector = dict()
+	for course in sorted(course_to_vector):
+		courses_of_vector.setdefault(tuple(course_to_vector[course]), []).append(course)
+
+	courses_of_ids = []
+	start = 0
+	while start < len(vectors):
+		end = start
+		while end < len(vectors) and vectors[end] == vectors[start]:
+			end += 1
+		courses = courses_of_vector.get(vectors[start], [])
+		copies = end - start
+		for copy in range(copies):
+			courses_of_ids.append(courses[copy::copies])
+		start = end
+	return courses_of_ids
+
+# Writes the course index of the vector problem with credit_maxes and vectors
+# courses_of_ids[i] is the list of (code, title, credits) tuples of the courses of the vector with id i
+def write_course_index(file_name, credit_maxes, vectors, courses_of_ids):
+	assert len(vectors) == len(courses_of_ids)
+
+	vector_starts = [0]
+	string_starts = [0]
+	strings = bytearray()
+	for courses in courses_of_ids:
+		for course in courses:
+			assert len(course) == STRINGS_PER_COURSE
+			for string in course:
+				strings += string.encode('utf-8')
+				string_starts.append(len(strings))
+		vector_starts.append(vector_starts[-1] + len(courses))
+
+	if os.path.dirname(file_name) != '':
+		os.makedirs(os.path.dirname(file_name), exist_ok = True)
+	with open(file_name, 'wb') as f:
+		f.write(COURSE_INDEX_HEADER.pack(COURSE_INDEX_MAGIC, COURSE_INDEX_VERSION, problem_fingerprint(credit_maxes, vectors), len(vectors), vector_starts[-1], len(strings)))
+		f.write(struct.pack('<{:d}I'.format(len(vector_starts)), *vector_starts))
+		f.write(struct.pack('<{:d}I'.format(len(string_starts)), *string_starts))
+		f.write(strings)
+
+# Reads a course index file. The file is memory-mapped, so opening it does not read the strings, and a lookup only reads the courses it returns.
+# Raises RuntimeError if the file is not a course index file.
+class CourseIndex:
+	def __init__(self, file_name):
+		with open(file_name, 'rb') as f:
+			header = f.read(COURSE_INDEX_HEADER.size)
+			if len(header) != COURSE_INDEX_HEADER.size:
+				raise RuntimeError('{:s} is not a course index file'.format(file_name))
+			magic, version, self.fingerprint, self.vector_count, self.course_count, string_bytes = COURSE_INDEX_HEADER.unpack(header)
+			if magic != COURSE_INDEX_MAGIC or version != COURSE_INDEX_VERSION:
+				raise RuntimeError('{:s} is not a course index file'.format(file_name))
+
+			self.vector_starts_offset = COURSE_INDEX_HEADER.size
+			self.string_starts_offset = self.vector_starts_offset + (self.vector_count + 1) * UINT32.size
+			self.strings_offset = self.string_starts_offset + (STRINGS_PER_COURSE * self.course_count + 1) * UINT32.size
+			if os.fstat(f.fileno()).st_size != self.strings_offset + string_bytes:
+				raise RuntimeError('{:s} is not a complete course index file'.format(file_name))
+			self.mmap = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+	def __len__(self):
+		return self.vector_count
+
+	# Return: whether this is the index of the vector problem with credit_maxes and vectors
+	def matches(self, credit_maxes, vectors):
+		return self.vector_count == len(vectors) and self.fingerprint == problem_fingerprint(credit_maxes, vectors)
+
+	def course_range(self, vector_id):
+		if not 0 <= vector_id < self.vector_count:
+			raise IndexError('vector id {:d} is not in the course index'.format(vector_id))
+		return UINT32_PAIR.unpack_from(self.mmap, self.vector_starts_offset + vector_id * UINT32.size)
+
+	def string(self, k):
+		start, end = UINT32_PAIR.unpack_from(self.mmap, self.string_starts_offset + k * UINT32.size)
+		return self.mmap[self.strings_offset + start:self.strings_offset + end].decode('utf-8')
+
+	# Return: the course codes of the courses of the vector with id vector_id, for example ['CAS WR 100', 'CAS WR 120']
+	def course_codes(self, vector_id):
+		start, end = self.course_range(vector_id)
+		return [self.string(STRINGS_PER_COURSE * j) for j in range(start, end)]
+
+	# Return: the (code, title, credits) tuples of the courses of the vector with id vector_id
+	def courses(self, vector_id):
+		start, end = self.course_range(vector_id)
+		return [tuple([self.string(STRINGS_PER_COURSE * j + k) for k in range(STRINGS_PER_COURSE)]) for j in range(start, end)]
@@ -1,11 +1,35 @@
 import requests  # http requests to the BU course search page
+from urllib3.util.retry import Retry  # installed with requests
 import re  # Regular expressions parsing
 
 import time
 import datetime
 import os
+import argparse
+import gzip
+import json
+import tempfile
+import struct
+import shutil
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
-from constants import ALL_SEMESTER_CODES, REQUEST_HOST, REQUEST_URL, REQUEST_DEFAULT_TIMEOUT_IN_SECONDS, PROBLEM_PARAMETERS
+from course_index import course_index_file_name, courses_of_vector_ids, write_course_index
+from constants import ALL_SEMESTER_CODES, REQUEST_HOST, REQUEST_URL, REQUEST_DEFAULT_TIMEOUT_IN_SECONDS, REQUEST_CONCURRENCY, REQUEST_RETRIES, REQUEST_BACKOFF_FACTOR, REQUEST_CACHE_DIRECTORY, REQUEST_CACHE_MAX_AGE_IN_SECONDS, REQUEST_CHUNK_SIZE_IN_BYTES, PROBLEM_PARAMETERS
+
+'''
+Returns a requests session for downloading pages of the search page.
+
+The session keeps up to concurrency connections open and reuses them, instead of opening a new connection for every request.
+Requests that fail to connect, time out or get a 429 or 5xx response are tried again with exponential backoff.
+'''
+def make_session(concurrency = REQUEST_CONCURRENCY, retries = REQUEST_RETRIES, backoff_factor = REQUEST_BACKOFF_FACTOR):
+	retry = Retry(total = retries, backoff_factor = backoff_factor, status_forcelist = (429, 500, 502, 503, 504))
+	adapter = requests.adapters.HTTPAdapter(pool_connections = 1, pool_maxsize = concurrency, max_retries = retry)
+	session = requests.Session()
+	session.mount('https://', adapter)
+	session.mount('http://', adapter)
+	return session
 
 '''
 Makes an http request to the BU course search page and returns the page's html.
@@ -14,8 +38,15 @@ This requires internet access.
 
 If the request times out but you have internet access and can access the BU Hub
 course search through the browser, try increasing request_timeout_limit.
+
+The request is made with session if it is not None. url can be changed to download from a stand-in for the search page.
 '''
-def request_courses(semester_code, hub_code, timeout = REQUEST_DEFAULT_TIMEOUT_IN_SECONDS):
+def request_courses(semester_code, hub_code, timeout = REQUEST_DEFAULT_TIMEOUT_IN_SECONDS, session = None, url = REQUEST_URL):
+	return request_courses_response(semester_code, hub_code, timeout, session, url).text
+
+# Same as request_courses, but returns the requests response. extra_headers are added to the headers of the request.
+# If stream is True, the body of the response is not downloaded until it is read, for example with response_chunks.
+def request_courses_response(semester_code, hub_code, timeout = REQUEST_DEFAULT_TIMEOUT_IN_SECONDS, session = None, url = REQUEST_URL, extra_headers = dict(), stream = False):
 	headers = {
 		'Accept' : 'text/html',
 		'Accept-Encoding': 'gzip, deflate, br',
@@ -24,6 +55,7 @@ def request_courses(semester_code, hub_code, timeout = REQUEST_DEFAULT_TIMEOUT_I
 		'Host': REQUEST_HOST,
 		'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.132 Safari/537.36'
 	}
+	headers.update(extra_headers)
 	params = {
 		'page': 'w0',
 		'pagesize': -1,
@@ -41,11 +73,205 @@ def request_courses(semester_code, hub_code, timeout = REQUEST_DEFAULT_TIMEOUT_I
 		'hub[]': hub_code,
 	}
 
-	print('downloading {:s} {:s}'.format(semester_code, hub_code))
-	r = requests.get(REQUEST_URL, headers=headers,params=params, timeout=timeout)
-	r = r.text
+	# One write per line, so that lines printed by different threads do not mix
+	print('downloading {:s} {:s}\n'.format(semester_code, hub_code), end = '')
+	r = (requests if session is None else session).get(url, headers=headers,params=params, timeout=timeout, stream=stream)
+	try:
+		r.raise_for_status()
+	except requests.HTTPError:
+		r.close()
+		raise
 	return r
 
+# Yields the html of a response made with stream = True in chunks of at most chunk_size characters, and closes the response after the last chunk.
+def response_chunks(r, chunk_size = REQUEST_CHUNK_SIZE_IN_BYTES):
+	# r.text guesses the encoding from the whole page if the headers do not give one, which a stream can not do
+	if r.encoding is None:
+		r.encoding = 'utf-8'
+	try:
+		for chunk in r.iter_content(chunk_size, decode_unicode = True):
+			yield chunk
+	finally:
+		r.close()
+
+# Return: the name of the file that the page for semester_code and hub_code is cached in
+def cache_file_name(cache_directory, semester_code, hub_code):
+	# Codes like '*' are escaped so that they can be file names
+	return os.path.join(cache_directory, urllib.parse.quote(semester_code, safe = ''), urllib.parse.quote(hub_code, safe = '') + '.html.gz')
+
+# Return: the header of the cache entry in file_name, or None if there is none or it can not be read
+def read_cache_header(file_name):
+	try:
+		# newline = '' keeps the line endings of the page as they are
+		with gzip.open(file_name, 'rt', encoding = 'utf-8', newline = '') as f:
+			return json.loads(f.readline())
+	except (OSError, EOFError, ValueError):
+		return None
+
+# Yields the page of the cache entry in file_name in chunks of at most chunk_size characters
+def read_cache_chunks(file_name, chunk_size = REQUEST_CHUNK_SIZE_IN_BYTES):
+	with gzip.open(file_name, 'rt', encoding = 'utf-8', newline = '') as f:
+		f.readline()
+		while True:
+			chunk = f.read(chunk_size)
+			if len(chunk) == 0:
+				break
+			yield chunk
+
+# Writes the cache entry with header and the page given in chunks to file_name, and yields the chunks as they are written.
+# The entry is written to a temporary file first, which only replaces file_name after the last chunk, so that a reader never sees a partly written entry.
+# chunks may be read from file_name itself.
+def write_cache_entry(file_name, header, chunks):
+	os.makedirs(os.path.dirname(file_name), exist_ok = True)
+	fd, temporary_file_name = tempfile.mkstemp(dir = os.path.dirname(file_name), suffix = '.tmp')
+	try:
+		with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding = 'utf-8', newline = '') as f:
+			f.write(json.dumps(header) + '\n')
+			for chunk in chunks:
+				f.write(chunk)
+				yield chunk
+		os.replace(temporary_file_name, file_name)
+	except BaseException:
+		os.remove(temporary_file_name)
+		raise
+
+'''
+Same as request_courses, but keeps the pages in cache_directory so that they are only downloaded again when they change.
+
+Each page is stored gzip compressed after a header line, which is a JSON object with
+	url: the url it was downloaded from. Pages cached from another url are not used.
+	etag, last_modified: the ETag and Last-Modified headers of the response, or None
+	downloaded: the time the page was downloaded
+	validated: the last time the search page said the page had not changed, or downloaded
+
+A cached page that was validated less than max_age seconds ago is returned without a request.
+Otherwise the request asks the search page to only send the page if it changed since it was cached (If-None-Match and If-Modified-Since).
+If it did not change, the search page answers 304 Not Modified and the cached page is used.
+
+If offline is True, no request is made. The cached page is returned no matter how old it is, and RuntimeError is raised if the page is not cached.
+If cache_directory is None, this is the same as request_courses.
+'''
+def request_courses_cached(semester_code, hub_code, cache_directory = REQUEST_CACHE_DIRECTORY, max_age = REQUEST_CACHE_MAX_AGE_IN_SECONDS, offline = False, session = None, url = REQUEST_URL):
+	return ''.join(request_courses_chunks(semester_code, hub_code, cache_directory, max_age, offline, session, url))
+
+# Same as request_courses_cached, but yields the page in chunks while it is downloaded or read from the cache, so the whole page is never in memory.
+# A downloaded page is written to the cache while it is read, and only replaces the cached page after the last chunk.
+def request_courses_chunks(semester_code, hub_code, cache_directory = REQUEST_CACHE_DIRECTORY, max_age = REQUEST_CACHE_MAX_AGE_IN_SECONDS, offline = False, session = None, url = REQUEST_URL):
+	if cache_directory is None:
+		assert not offline
+		yield from response_chunks(request_courses_response(semester_code, hub_code, session = session, url = url, stream = True))
+		return
+
+	file_name = cache_file_name(cache_directory, semester_code, hub_code)
+	header = read_cache_header(file_name)
+	if header is not None and header['url'] != url:
+		header = None
+
+	if offline:
+		if header is None:
+			raise RuntimeError('{:s} {:s} from {:s} is not in the cache {:s}'.format(semester_code, hub_code, url, cache_directory))
+		yield from read_cache_chunks(file_name)
+		return
+
+	now = time.time()
+	if header is not None and 0 <= now - header['validated'] < max_age:
+		yield from read_cache_chunks(file_name)
+		return
+
+	validators = dict()
+	if header is not None and header['etag'] is not None:
+		validators['If-None-Match'] = header['etag']
+	if header is not None and header['last_modified'] is not None:
+		validators['If-Modified-Since'] = header['last_modified']
+
+	r = request_courses_response(semester_code, hub_code, session = session, url = url, extra_headers = validators, stream = True)
+	if r.status_code == 304 and header is not None:
+		r.close()
+		header['validated'] = now
+		header['etag'] = r.headers.get('ETag', header['etag'])
+		yield from write_cache_entry(file_name, header, read_cache_chunks(file_name))
+	else:
+		header = {
+			'url': url,
+			'etag': r.headers.get('ETag'),
+			'last_modified': r.headers.get('Last-Modified'),
+			'downloaded': now,
+			'validated': now,
+		}
+		yield from write_cache_entry(file_name, header, response_chunks(r))
+
+# Courses of the pages read by request_all_courses without a cache, by (url, semester code, hub code, keys), so that the write_problem calls of one run do not download a page twice
+uncached_courses = dict()
+
+'''
+Downloads the pages of the search page for every (semester code, hub code) pair in pairs, up to concurrency pages at a time over one session.
+Pages are cached as described in request_courses_cached. If cache_directory is None, the courses of each page are kept in memory instead,
+so a page is only downloaded once per run.
+Returns a dict from each pair to the list of courses on its page, as returned by read_downloaded_html.
+
+Each page is read by iter_downloaded_html while it is downloaded, so pages are never kept in memory, only the courses.
+If keys is not None, the courses only keep the given keys.
+'''
+def request_all_courses(pairs, concurrency = REQUEST_CONCURRENCY, url = REQUEST_URL, cache_directory = REQUEST_CACHE_DIRECTORY, max_age = REQUEST_CACHE_MAX_AGE_IN_SECONDS, offline = False, keys = None):
+	def read_page(pair):
+		courses = []
+		for course_info in iter_downloaded_html(request_courses_chunks(pair[0], pair[1], cache_directory, max_age, offline, session, url)):
+			courses.append(course_info if keys is None else {k: course_info[k] for k in keys})
+		return courses
+
+	pairs = list(dict.fromkeys(pairs))
+	if keys is not None:
+		keys = tuple(keys)
+	missing_pairs = pairs
+	if cache_directory is None:
+		missing_pairs = [pair for pair in pairs if (url, pair[0], pair[1], keys) not in uncached_courses]
+
+	session = make_session(concurrency)
+	try:
+		with ThreadPoolExecutor(max_workers = concurrency) as executor:
+			pages = dict(zip(missing_pairs, executor.map(read_page, missing_pairs)))
+	finally:
+		session.close()
+
+	if cache_directory is None:
+		for pair in missing_pairs:
+			uncached_courses[(url, pair[0], pair[1], keys)] = pages[pair]
+		pages = {pair: uncached_courses[(url, pair[0], pair[1], keys)] for pair in pairs}
+	return pages
+
+# Regex pattern to read the html of one result of the search result page and capture the course's information
+COURSE_RESULT_PATTERN = re.compile(r'<li class="coursearch-result" id="coursearch-result-([A-Z]{3})([A-Z]{2})(\d{3})">\n[ \t]+<div class="coursearch-result-content">\n[ \t]+<div class="coursearch-result-heading">\n[ \t]+<h6>\1 \2 \3</h6>\n[ \t]+<h2>([^\n]*)</h2>\n[ \t]+</div>\n[ \t]*\n[ \t]+<div class="coursearch-result-content-description">\n[ \t]*\n[ \t]+<p>((?:Prereq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]+<p>((?:Grad Prereq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]+<p>((?:Coreq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]+<p>((?:Grad Coreq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]*\n[ \t]+<p>([^\n]*)</p>\n[ \t]+<p>([^\n]+)</p>\n(?:[ \t]*|[ \t]+Offered:[^\n]+<br /><br />)\n[ \t]+</div>\n[ \t]+</div>')
+# Every result starts with this
+COURSE_RESULT_START = '<li class="coursearch-result" id="coursearch-result-'
+# The number of results that the site's search returned, which is written before the results
+SEARCHES_FOUND_PATTERN = re.compile(r'returned <strong>(\d+)</strong> classes')
+# Text before the results is only kept this long while looking for SEARCHES_FOUND_PATTERN, which is shorter
+SEARCHES_FOUND_MAX_LENGTH = 64
+MULTIPLE_SPACES_PATTERN = re.compile(r' {2,}')
+
+# Captured values are single lines, so only runs of spaces have to be replaced
+def collapse_spaces(text):
+	if '  ' in text:
+		return MULTIPLE_SPACES_PATTERN.sub(' ', text)
+	return text
+
+# Converts a match of COURSE_RESULT_PATTERN to a dictionary.
+# TODO: Clean up the values of prereqs
+def course_result_to_course(match):
+	item = match.groups()
+	return {
+		'College': item[0],
+		'Department': item[1],
+		'Course Number': item[2],
+		'Title': collapse_spaces(item[3]),
+		'Prereq': collapse_spaces(item[4]),
+		'Grad Prereq': collapse_spaces(item[5]),
+		'Coreq': collapse_spaces(item[6]),
+		'Grad Coreq': collapse_spaces(item[7]),
+		'Description': collapse_spaces(item[8]),
+		'Credits': item[9].strip('[]').strip(' '),
+	}
+
 '''
 Reads the html produced by request_courses, extracts the course information using regex,
 and returns a list of dictionaries, where each dictionary contains the information
@@ -64,48 +290,69 @@ Description
 Credits
 '''
 def read_downloaded_html(html):
-	# Regex pattern to read the html of the search result page and capture a course's information
-	course_result_pattern = r'<li class="coursearch-result" id="coursearch-result-([A-Z]{3})([A-Z]{2})(\d{3})">\n[ \t]+<div class="coursearch-result-content">\n[ \t]+<div class="coursearch-result-heading">\n[ \t]+<h6>\1 \2 \3</h6>\n[ \t]+<h2>([^\n]*)</h2>\n[ \t]+</div>\n[ \t]*\n[ \t]+<div class="coursearch-result-content-description">\n[ \t]*\n[ \t]+<p>((?:Prereq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]+<p>((?:Grad Prereq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]+<p>((?:Coreq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]+<p>((?:Grad Coreq: [^\n]*<br />)?)</p>\n[ \t]*\n[ \t]*\n[ \t]+<p>([^\n]*)</p>\n[ \t]+<p>([^\n]+)</p>\n(?:[ \t]*|[ \t]+Offered:[^\n]+<br /><br />)\n[ \t]+</div>\n[ \t]+</div>'
+	return list(iter_downloaded_html((html,)))
 
-	results = re.findall(course_result_pattern, html)
-	
-	# Ensure that our html parser finds as many results as returned by the site's search.
-	searches_found_pattern = 'returned <strong>(\d+)</strong> classes'
-	searches_found_result = re.search(searches_found_pattern, html)
-	assert searches_found_result is not None
-	# print('Found {:d} results but was given {:d} results'.format(len(results), int(searches_found_result.expand(r'\1'))))
-	assert int(searches_found_result.expand(r'\1')) == len(results)
-
-	# Converts elements of re.findall(course_result_pattern, ...) to dictionaries.
-	# TODO: Clean up the values of prereqs
-	def regex_match_to_course(item):
-		return {
-			'College': item[0],
-			'Department': item[1],
-			'Course Number': item[2],
-			'Title': re.sub(r'[ \n]+', ' ', item[3]),
-			'Prereq': re.sub(r'[ \n]+', ' ', item[4]),
-			'Grad Prereq': re.sub(r'[ \n]+', ' ', item[5]),
-			'Coreq': re.sub(r'[ \n]+', ' ', item[6]),
-			'Grad Coreq': re.sub(r'[ \n]+', ' ', item[7]),
-			'Description': re.sub(r'[ \n]+', ' ', item[8]),
-			'Credits': item[9].strip('[]').strip(' '),
-		}
+'''
+Same as read_downloaded_html, but reads the html from chunks, an iterable of strings, and yields each course as soon as its result has been read.
+For example, chunks can be r.iter_content(chunk_size, decode_unicode = True) of a streamed response.
+
+Only the result being read is kept in memory, so the memory used does not depend on the number of results on the page.
+After the last course, this checks that the number of courses found is the number of results returned by the site's search.
+'''
+def iter_downloaded_html(chunks):
+	searches_found = None
+	courses_found = 0
+	# The text read but not parsed yet is buffer[position:]
+	buffer = ''
+	position = 0
+	# Whether buffer[position:] starts with a result
+	in_results = False
+	chunks = iter(chunks)
+	done = False
+	while not done:
+		chunk = next(chunks, None)
+		if chunk is None:
+			done = True
+		else:
+			buffer = buffer[position:] + chunk
+			position = 0
+
+		# Find the first result, and the number of results written before it
+		if not in_results:
+			i = buffer.find(COURSE_RESULT_START)
+			match = SEARCHES_FOUND_PATTERN.search(buffer, 0, len(buffer) if i == -1 else i)
+			if match is not None:
+				searches_found = int(match.group(1))
+			if i == -1:
+				position = max(0, len(buffer) - SEARCHES_FOUND_MAX_LENGTH)
+				continue
+			position = i
+			in_results = True
 
-	results_as_dicts = list(map(regex_match_to_course, results))
-	# for x in results_as_dicts:
-		# print()
-		# for k, v in x.items():
-			# print(k, v)
-	return results_as_dicts
+		# A result ends where the next result starts, or the last one where the page ends
+		while position < len(buffer):
+			i = buffer.find(COURSE_RESULT_START, position + 1)
+			if i == -1 and not done:
+				break
+			match = COURSE_RESULT_PATTERN.match(buffer, position, len(buffer) if i == -1 else i)
+			if match is not None:
+				courses_found += 1
+				yield course_result_to_course(match)
+			position = len(buffer) if i == -1 else i
+
+	# Ensure that our html parser finds as many results as returned by the site's search.
+	assert searches_found is not None
+	assert searches_found == courses_found
 
 '''
-This uses request_courses, which makes an internet connection and downloads the html.
+This uses request_courses, which makes an internet connection and downloads the html, unless the pages are cached. See request_courses_cached for cache_directory, max_age and offline.
 This function takes in the graduation requirements (eg first years or transfers) and gathers all the hub course information and writes out the vector problem.
 
 If there are more courses that fulfill the same set of units than the number of each unit required, then the excess duplicate vectors are not listed.
+If binary is True, the problem is written in the binary format described in write_binary_problem_file.
+The courses of each vector are written to a course index file next to the problem file, see course_index.py.
 '''
-def write_problem(output_file_name, semester_codes, credit_maxes, hub_columns):
+def write_problem(output_file_name, semester_codes, credit_maxes, hub_columns, concurrency = REQUEST_CONCURRENCY, url = REQUEST_URL, cache_directory = REQUEST_CACHE_DIRECTORY, max_age = REQUEST_CACHE_MAX_AGE_IN_SECONDS, offline = False, binary = False):
 	start = time.time()
 	
 	if isinstance(semester_codes, list):
@@ -136,66 +383,135 @@ def write_problem(output_file_name, semester_codes, credit_maxes, hub_columns):
 	print('assertions took {:.2f} seconds'.format(time.time() - start))
 	start = time.time()
 
+	# Download all pages at once
+	pages = request_all_courses([(semester_code, hub_code) for semester_code in semester_codes for hub_codes in hub_columns for hub_code in hub_codes], concurrency, url, cache_directory, max_age, offline, ('College', 'Department', 'Course Number', 'Title', 'Credits'))
+
+	print('downloading and reading pages took {:.2f} seconds'.format(time.time() - start))
+	start = time.time()
+
 	# Gather course vectors
 	course_to_vector = dict()
+	# (college, dept, num) -> (code, title, credits) of the course, for the course index
+	course_fields = dict()
 	for semester_code in semester_codes:
 		for hub_credit_index, hub_codes in enumerate(hub_columns):
 			for hub_code in hub_codes:
-				html = request_courses(semester_code, hub_code)
-				course_infos = read_downloaded_html(html)
-				for course_info in course_infos:
+				for course_info in pages[(semester_code, hub_code)]:
 					# Courses are indexed by (college, dept, num)
 					course = (course_info['College'], course_info['Department'], course_info['Course Number'])
 					
 					if course not in course_to_vector:
 						course_to_vector[course] = [0] * len(hub_columns)
+						course_fields[course] = (' '.join(course), course_info['Title'], course_info['Credits'])
 					course_to_vector[course][hub_credit_index] = 1
 
 	print('building vectors took {:.2f} seconds'.format(time.time() - start))
 	start = time.time()
 	
-	# Remove extra vectors if there exist more equal vectors than the max of that vector.
+	vectors = remove_excess_vectors(credit_maxes, [tuple(x) for x in course_to_vector.values()])
+	metadata = [
+		'date generated: {!s:s}'.format(datetime.datetime.now()),
+		'columns: {!s:s}'.format(hub_columns),
+		'semester codes: {!s:s}'.format(semester_codes),
+	]
+	write_problem_file(output_file_name, metadata, credit_maxes, vectors, binary)
+	write_course_index(course_index_file_name(output_file_name), credit_maxes, vectors, courses_of_vector_ids(vectors, {course_fields[course]: tuple(vector) for course, vector in course_to_vector.items()}))
+
+	print('writing vectors to file took {:.2f} seconds'.format(time.time() - start))
+	start = time.time()
+
+# Return: the sorted vectors, without the extra vectors if there exist more equal vectors than the max of that vector.
+def remove_excess_vectors(credit_maxes, vectors):
 	vec_count = dict()
-	for course in course_to_vector:
-		key = tuple(course_to_vector[course])
-		if key not in vec_count:
-			vec_count[key] = 0
-		vec_count[key] += 1
+	for vec in vectors:
+		if vec not in vec_count:
+			vec_count[vec] = 0
+		vec_count[vec] += 1
 	for vec in vec_count:
 		dot_product = [a * b for a, b in zip(vec, credit_maxes)]
 		highest_requirement_of_fulfilled = max(dot_product)
 		if vec_count[vec] > highest_requirement_of_fulfilled:
 			vec_count[vec] = highest_requirement_of_fulfilled
-	
+	return [vec for vec in sorted(vec_count.keys()) for _ in range(vec_count[vec])]
+
+# Binary vector problem files start with BINARY_PROBLEM_MAGIC. Text vector problem files start with a digit, so the formats can be told apart.
+BINARY_PROBLEM_MAGIC = b'VECPROB\x00'
+BINARY_PROBLEM_VERSION = 1
+# magic, version, number of bytes of metadata, M, N
+BINARY_PROBLEM_HEADER = struct.Struct('<8sIIII')
+
+# Writes a vector problem file as described in VectorProblemFormat.txt.
+# metadata is a list of lines without new line characters.
+# If binary is True, the file is written in the binary format instead of the text format.
+def write_problem_file(output_file_name, metadata, credit_maxes, vectors, binary = False):
 	# Make directory of write location
-	try:
-		os.makedirs(os.path.dirname(output_file_name))
-	except FileExistsError:
-		pass
-		
+	if os.path.dirname(output_file_name) != '':
+		os.makedirs(os.path.dirname(output_file_name), exist_ok = True)
+
+	if binary:
+		write_binary_problem_file(output_file_name, metadata, credit_maxes, vectors)
+		return
+
 	# Write to file
 	with open(output_file_name, 'w') as f:
-		f.write('3\n')
-		f.write('date generated: {!s:s}\n'.format(datetime.datetime.now()))
-		f.write('columns: {!s:s}\n'.format(hub_columns))
-		f.write('semester codes: {!s:s}\n'.format(semester_codes))
-		f.write('{:d}\n'.format(len(hub_columns)))
-		f.write('{:d}\n'.format(sum(vec_count.values())))
+		f.write('{:d}\n'.format(len(metadata)))
+		for line in metadata:
+			f.write(line + '\n')
+		f.write('{:d}\n'.format(len(credit_maxes)))
+		f.write('{:d}\n'.format(len(vectors)))
 		f.write(' ' * 5 + ' '.join(map(str, credit_maxes)))
 		f.write('\n')
-		vector_id = 0
-		for vec in sorted(vec_count.keys()):
-			for _ in range(vec_count[vec]):
-				f.write('{:4d} '.format(vector_id) + ' '.join(map(str, vec)))
-				f.write('\n')
-				vector_id += 1
+		for vector_id, vec in enumerate(vectors):
+			f.write('{:4d} '.format(vector_id) + ' '.join(map(str, vec)))
+			f.write('\n')
 
-	print('writing vectors to file took {:.2f} seconds'.format(time.time() - start))
-	start = time.time()
+'''
+Writes a vector problem file in the binary format, which is
+	BINARY_PROBLEM_HEADER: BINARY_PROBLEM_MAGIC, BINARY_PROBLEM_VERSION, the number of bytes of metadata, M, N
+	the metadata lines joined by new line characters, utf-8 encoded
+	M bytes: the credit_maxes vector
+	N * M bytes: the course vectors, one after another. Vector i is at bytes i * M to (i + 1) * M, so the vector id is not stored.
+Integers in the header are little endian. Every integer of credit_maxes and the vectors must be from 0 to 255.
+'''
+def write_binary_problem_file(output_file_name, metadata, credit_maxes, vectors):
+	metadata_bytes = '\n'.join(metadata).encode('utf-8')
+	for vec in vectors:
+		assert len(vec) == len(credit_maxes)
+	with open(output_file_name, 'wb') as f:
+		f.write(BINARY_PROBLEM_HEADER.pack(BINARY_PROBLEM_MAGIC, BINARY_PROBLEM_VERSION, len(metadata_bytes), len(credit_maxes), len(vectors)))
+		f.write(metadata_bytes)
+		# bytes raises ValueError for integers that are not from 0 to 255
+		f.write(bytes(credit_maxes))
+		f.write(bytes([x for vec in vectors for x in vec]))
+
+def is_binary_problem_file(input_file_name):
+	with open(input_file_name, 'rb') as f:
+		return f.read(len(BINARY_PROBLEM_MAGIC)) == BINARY_PROBLEM_MAGIC
+
+# Return: the metadata lines, the offset of the credit_maxes vector, M and N of the binary vector problem file whose first bytes are data
+def read_binary_problem_header(data):
+	assert len(data) >= BINARY_PROBLEM_HEADER.size
+	magic, version, metadata_length, M, N = BINARY_PROBLEM_HEADER.unpack_from(data)
+	assert magic == BINARY_PROBLEM_MAGIC
+	assert version == BINARY_PROBLEM_VERSION
+	offset = BINARY_PROBLEM_HEADER.size + metadata_length
+	assert len(data) >= offset
+	metadata = bytes(data[BINARY_PROBLEM_HEADER.size:offset]).decode('utf-8')
+	metadata = metadata.split('\n') if metadata_length > 0 else []
+	return metadata, offset, M, N
+
+# Return: the metadata lines, credit_maxes and vectors of a vector problem file in either format
+def read_problem_file(input_file_name):
+	if is_binary_problem_file(input_file_name):
+		with open(input_file_name, 'rb') as f:
+			data = f.read()
+		metadata, offset, M, N = read_binary_problem_header(data)
+		assert len(data) == offset + M + N * M
+		credit_maxes = tuple(data[offset:offset + M])
+		offset += M
+		vectors = tuple([tuple(data[offset + i * M:offset + (i + 1) * M]) for i in range(N)])
+		return metadata, credit_maxes, vectors
 
-# Import this where the course vectors and credit_maxes vector has to be extracted from a file.
-# TODO: possibly include vector id in return value.
-def read_problem(input_file_name):
 	# Read files into strings
 	with open(input_file_name, 'r') as f:
 		content = f.readlines()
@@ -204,10 +520,12 @@ def read_problem(input_file_name):
 		content = list(content)
 		
 		A = int(content[0])
+		metadata = content[1:A + 1]
 		M = int(content[A + 1])
 		N = int(content[A + 2])
 		
-		string_to_vector = lambda x: tuple(map(int, re.sub(' +', ' ', x.strip(' ')).split(' ')))
+		# Integers are separated by one or more spaces
+		string_to_vector = lambda x: tuple(map(int, x.split()))
 		
 		credit_maxes = string_to_vector(content[A + 3])
 		assert len(credit_maxes) == M
@@ -221,20 +539,65 @@ def read_problem(input_file_name):
 			assert len(vectors[i]) == M
 		vectors = tuple(vectors)
 
+	return metadata, credit_maxes, vectors
+
+# Import this where the course vectors and credit_maxes vector has to be extracted from a file.
+# The file can be in the text format or the binary format.
+# TODO: possibly include vector id in return value.
+def read_problem(input_file_name):
+	metadata, credit_maxes, vectors = read_problem_file(input_file_name)
 	return credit_maxes, vectors
 
-# request_courses uses cached values
-def table_decorator(func):
-	table = dict()
-	def wrapper(a, b):
-		if (a, b) not in table:
-			table[(a, b)] = func(a, b)
-		return table[(a, b)]
-	return wrapper
-request_courses = table_decorator(request_courses)
+'''
+Return: credit_maxes and the vectors as an N by M numpy array of uint8, where row i is the vector with id i.
+For a binary vector problem file the array is memory-mapped, so it is not read until it is used.
+'''
+def read_problem_matrix(input_file_name):
+	# Imported here since the rest of this file does not need numpy
+	import numpy as np
+
+	if not is_binary_problem_file(input_file_name):
+		credit_maxes, vectors = read_problem(input_file_name)
+		return credit_maxes, np.array(vectors, dtype = np.uint8).reshape((len(vectors), len(credit_maxes)))
+
+	with open(input_file_name, 'rb') as f:
+		header = f.read(BINARY_PROBLEM_HEADER.size)
+		assert len(header) == BINARY_PROBLEM_HEADER.size
+		metadata, offset, M, N = read_binary_problem_header(header + f.read(BINARY_PROBLEM_HEADER.unpack(header)[2]))
+		credit_maxes = tuple(f.read(M))
+		assert len(credit_maxes) == M
+		assert os.fstat(f.fileno()).st_size == offset + M + N * M
+	if N == 0:
+		return credit_maxes, np.zeros((0, M), dtype = np.uint8)
+	return credit_maxes, np.memmap(input_file_name, dtype = np.uint8, mode = 'r', offset = offset + M, shape = (N, M))
+
+# Converts a vector problem file in either format to output_file_name, in the binary format if binary is True and in the text format otherwise
+# The course index of the input file is copied next to the output file.
+def convert_problem_file(input_file_name, output_file_name, binary):
+	metadata, credit_maxes, vectors = read_problem_file(input_file_name)
+	write_problem_file(output_file_name, metadata, credit_maxes, vectors, binary)
+	if os.path.exists(course_index_file_name(input_file_name)) and course_index_file_name(input_file_name) != course_index_file_name(output_file_name):
+		shutil.copyfile(course_index_file_name(input_file_name), course_index_file_name(output_file_name))
 
 # Run your programs!
 # Writes the course vectors to a file.
 if __name__ == '__main__':
-	for file_name, columns, credit_maxes in PROBLEM_PARAMETERS:
-		write_problem(file_name, ALL_SEMESTER_CODES, credit_maxes, columns)
\ No newline at end of file
+	parser = argparse.ArgumentParser(description = 'Writes the vector problems in PROBLEM_PARAMETERS.')
+	parser.add_argument('--offline', action = 'store_true', help = 'only use pages in the cache, without internet access')
+	parser.add_argument('--max-age', type = float, default = REQUEST_CACHE_MAX_AGE_IN_SECONDS, help = 'seconds that a cached page is used for before it is revalidated, 0 to revalidate every page')
+	parser.add_argument('--cache-directory', default = REQUEST_CACHE_DIRECTORY)
+	parser.add_argument('--no-cache', action = 'store_true', help = 'download every page and do not cache them')
+	parser.add_argument('--binary', action = 'store_true', help = 'write the problems in the binary format, to .bin files instead of .txt files')
+	parser.add_argument('--to-binary', nargs = 2, metavar = ('INPUT', 'OUTPUT'), help = 'only convert the vector problem file INPUT to the binary format')
+	parser.add_argument('--to-text', nargs = 2, metavar = ('INPUT', 'OUTPUT'), help = 'only convert the vector problem file INPUT to the text format')
+	args = parser.parse_args()
+
+	if args.to_binary is not None:
+		convert_problem_file(args.to_binary[0], args.to_binary[1], True)
+	elif args.to_text is not None:
+		convert_problem_file(args.to_text[0], args.to_text[1], False)
+	else:
+		for file_name, columns, credit_maxes in PROBLEM_PARAMETERS:
+			if args.binary:
+				file_name = os.path.splitext(file_name)[0] + '.bin'
+			write_problem(file_name, ALL_SEMESTER_CODES, credit_maxes, columns, cache_directory = None if args.no_cache else args.cache_directory, max_age = args.max_age, offline = args.offline, binary = args.binary)
@@ -0,0 +1,138 @@
+'''
+Reports what the algorithms do while they compute tables, so that builds can be profiled without changing the code.
+
+Work is reported as events, which are dicts with at least the keys 'event' and 'name':
+	{'event': 'span', 'name': ..., 'seconds': ..., 'counters': {...}, ...} when a phase ends. counters holds the totals of the count calls made during the phase.
+	{'event': 'point', 'name': ..., ...} for a single measurement, for example one level of a build.
+Other keys are the fields passed by the caller. If memory sampling is on, every event also has 'peak_rss_bytes'.
+
+Nothing is reported and almost nothing is computed until a reporter is set with set_reporter. A reporter is any function that takes an event.
+print_report prints events for a terminal and JsonLogReporter writes one JSON object per line.
+If the environment variable in TRACE_FILE_ENVIRONMENT_VARIABLE is set, events are appended to that file as JSON lines, with memory sampling on.
+'''
+
+import json
+import os
+import resource
+import sys
+import time
+
+TRACE_FILE_ENVIRONMENT_VARIABLE = 'HUB_TRACE_FILE'
+
+# The current reporter, or None if nothing is reported
+reporter = None
+sample_memory = False
+
+# Spans that have started and not ended, innermost last
+open_spans = []
+
+def set_reporter(new_reporter, memory = False):
+	global reporter, sample_memory
+	reporter = new_reporter
+	sample_memory = memory
+
+def enabled():
+	return reporter is not None
+
+def peak_rss_bytes():
+	# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+def emit(event):
+	if sample_memory:
+		event['peak_rss_bytes'] = peak_rss_bytes()
+	reporter(event)
+
+# Reports a single measurement
+def point(name, **fields):
+	if reporter is None:
+		return
+	event = {'event': 'point', 'name': name}
+	event.update(fields)
+	emit(event)
+
+# Adds value to the counter name of every open span
+def count(name, value = 1):
+	if reporter is None:
+		return
+	for s in open_spans:
+		s.counters[name] = s.counters.get(name, 0) + value
+
+class Span:
+	def __init__(self, name, fields):
+		self.name = name
+		self.fields = fields
+		self.counters = dict()
+
+	def __enter__(self):
+		open_spans.append(self)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		seconds = time.perf_counter() - self.start
+		open_spans.remove(self)
+		# The reporter may have been removed while the span was open
+		if reporter is None:
+			return False
+		event = {'event': 'span', 'name': self.name, 'seconds': seconds, 'counters': self.counters}
+		event.update(self.fields)
+		if exc_type is not None:
+			event['error'] = exc_type.__name__
+		emit(event)
+		return False
+
+	# Adds fields to the event that is reported when the span ends
+	def set(self, **fields):
+		self.fields.update(fields)
+
+class NoSpan:
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+	def set(self, **fields):
+		pass
+
+NO_SPAN = NoSpan()
+
+# Usage: with span('closure', states = n): ...
+# Reports the time the block took and the counters counted in it when the block ends.
+def span(name, **fields):
+	if reporter is None:
+		return NO_SPAN
+	return Span(name, fields)
+
+def format_value(value):
+	if isinstance(value, float):
+		return '{:.4g}'.format(value)
+	return str(value)
+
+# Prints events in the style of the messages the programs used to print
+def print_report(event):
+	fields = ', '.join(['{:s} {:s}'.format(k, format_value(v)) for k, v in event.items() if k not in ('event', 'name', 'seconds', 'counters')])
+	if event['event'] == 'span':
+		counters = ', '.join(['{:s} {:d}'.format(k, v) for k, v in event['counters'].items()])
+		print('{:s} required {:.2f} seconds{:s}{:s}'.format(event['name'], event['seconds'], '; ' + fields if len(fields) > 0 else '', '; ' + counters if len(counters) > 0 else ''))
+	else:
+		print('{:s}: {:s}'.format(event['name'], fields))
+
+class JsonLogReporter:
+	def __init__(self, file):
+		self.file = file
+
+	def __call__(self, event):
+		event['time'] = time.time()
+		self.file.write(json.dumps(event) + '\n')
+		self.file.flush()
+
+# Called by the programs run from the terminal, so that they print their progress unless events already go somewhere else
+def report_to_terminal():
+	if reporter is None:
+		set_reporter(print_report)
+
+if os.environ.get(TRACE_FILE_ENVIRONMENT_VARIABLE):
+	set_reporter(JsonLogReporter(open(os.environ[TRACE_FILE_ENVIRONMENT_VARIABLE], 'a')), memory = True)
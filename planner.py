@@ -0,0 +1,130 @@
+'''
+Picks the algorithm to answer queries with from the size of the vector problem.
+
+algo2.py keeps the table in memory and has to compute it every time it is run.
+algo3.py writes the table to a file once and memory-maps it afterwards, which only pays off for problems whose table takes long to compute or does not fit in memory.
+algo.py is not considered since it only answers the query where no credits are fulfilled yet.
+
+The cost model below was measured with the numpy engine of algo2.build_table on one core.
+'''
+
+from collections import namedtuple, Counter
+import time
+import sys
+import random
+
+import algo2
+import algo3
+import instrumentation
+from algo3 import open_table
+from download_problems import read_problem
+
+# Seconds that building the table needs per state per vector, after remove_unneeded_vectors
+BUILD_SECONDS_PER_STATE_VECTOR = 5e-8
+
+# Bytes of memory that building the table needs per state, besides a constant overhead
+BUILD_BYTES_PER_STATE = 16
+BUILD_BYTES_OVERHEAD = algo2.NUMPY_BUILD_CHUNK_ELEMENTS * 8 * 4
+
+# Tables that are predicted to take at least this long to build are written to a table file so that they are only built once
+TABLE_FILE_MIN_BUILD_SECONDS = 5
+
+# Tables whose build is predicted to need more memory than this are written to a table file so that they are not kept in memory
+IN_MEMORY_MAX_BYTES = 1 << 30
+
+# engine is 'algo2' or 'algo3'
+Plan = namedtuple('Plan', ['engine', 'states', 'vectors', 'build_seconds', 'build_bytes', 'file_bytes', 'reason'])
+
+def count_states(credit_maxes):
+	states = 1
+	for x in credit_maxes:
+		states *= x + 1
+	return states
+
+# Returns a finalized Table or PackedTable from table_file_name for the given problem, or None if there is none
+def open_existing_table(credit_maxes, vectors, table_file_name):
+	try:
+		table = open_table(table_file_name)
+	except (OSError, RuntimeError):
+		return None
+	if table.credit_maxes != credit_maxes or table.vectors_with_ids != tuple(enumerate(vectors)):
+		return None
+	return table
+
+# Input: the credit_maxes and vectors of the vector problem, the table file name that algo3 would use or None, and the number of build processes
+# Return: a Plan
+def make_plan(credit_maxes, vectors, table_file_name = None, processes = 1):
+	states = count_states(credit_maxes)
+	needed_vectors = algo2.remove_unneeded_vectors(credit_maxes, sorted(vectors, reverse = True))
+	# The search runs over the states of the merged vector problem, see algo2.build_table
+	merged_credit_maxes, _ = algo2.merge_categories(credit_maxes, needed_vectors, algo2.merged_categories(credit_maxes, needed_vectors))
+	build_seconds = BUILD_SECONDS_PER_STATE_VECTOR * count_states(merged_credit_maxes) * len(needed_vectors) / processes
+	build_bytes = BUILD_BYTES_PER_STATE * states + BUILD_BYTES_OVERHEAD
+	file_bytes = 1 + 1 + 2 + len(credit_maxes) + len(vectors) * (2 + len(credit_maxes)) + states * 4 + 4
+
+	if table_file_name is None:
+		engine, reason = 'algo2', 'no table file name was given'
+	elif open_existing_table(credit_maxes, vectors, table_file_name) is not None:
+		engine, reason = 'algo3', 'the table file is already computed'
+		build_seconds = 0.0
+		build_bytes = 0
+	elif build_bytes > IN_MEMORY_MAX_BYTES:
+		engine, reason = 'algo3', 'the table does not fit in memory'
+	elif build_seconds >= TABLE_FILE_MIN_BUILD_SECONDS:
+		engine, reason = 'algo3', 'the table takes long to build'
+	else:
+		engine, reason = 'algo2', 'the table is quick to build'
+
+	return Plan(engine, states, len(needed_vectors), build_seconds, build_bytes, file_bytes, reason)
+
+# Input: the credit_maxes and vectors of the vector problem, and a query function of algo2.make_query_function for them
+# Return: A function that answers the same queries with the ids of the vectors under the original order, as algo3's query functions do.
+# Equal vectors are interchangeable, so a vector selected k times takes k distinct random ids of its copies.
+def with_vector_ids(credit_maxes, vectors, query):
+	# The vectors that the indices of query refer to, see algo2.make_query_function
+	needed_vectors = algo2.remove_unneeded_vectors(credit_maxes, sorted(vectors, reverse = True))
+	vector_id_table = algo3.make_vector_id_table(list(enumerate(vectors)))
+
+	def query_ids(fulfilled_credits):
+		res = query(fulfilled_credits)
+		if res is None:
+			return None
+		out = []
+		for vector, copies in Counter([needed_vectors[index] for index in res]).items():
+			out.extend(random.sample(vector_id_table[vector], copies))
+		return sorted(out)
+
+	return query_ids
+
+# Input: the credit_maxes and vectors of the vector problem, the table file name that algo3 would use or None, and the number of build processes
+# Return: A function that takes as input a set of fulfilled credits and returns the sorted ids of a set of vectors of minimal size that fulfills the rest,
+# computed by the algorithm that make_plan picks. The ids are the indices of the vectors in vectors, whichever algorithm is picked.
+def make_query_function(credit_maxes, vectors, table_file_name = None, processes = 1):
+	plan = make_plan(credit_maxes, vectors, table_file_name, processes)
+
+	# The span reports the plan with the actual time and peak memory
+	with instrumentation.span('planned build', **plan._asdict()) as s:
+		if plan.engine == 'algo2':
+			query = with_vector_ids(credit_maxes, vectors, algo2.make_query_function(credit_maxes, vectors, 'numpy', processes))
+		else:
+			query = algo3.make_query_function(credit_maxes, vectors, table_file_name, 'numpy', processes)
+		s.set(peak_rss_bytes = instrumentation.peak_rss_bytes())
+
+	return query
+
+if __name__ == '__main__':
+	if len(sys.argv) not in (2, 3):
+		print('Usage:')
+		print()
+		print('python3 {:s} filename [table_file_name]'.format(__file__))
+	else:
+		instrumentation.report_to_terminal()
+		credit_maxes, unsorted_vectors = read_problem(sys.argv[1])
+		query = make_query_function(credit_maxes, unsorted_vectors, sys.argv[2] if len(sys.argv) == 3 else None)
+
+		start = time.time()
+		for i in range(1 << 14):
+			res = query(tuple([random.randint(0, x) for x in credit_maxes]))
+			if i % (1 << 10) == 0:
+				print(i, res)
+		print('computing {:d} sets required {:.2f} seconds'.format(1 << 14, time.time() - start))
@@ -0,0 +1,269 @@
+'''
+Serves queries on a finalized algo3 table file, in either table file format, over a local socket.
+
+The table file is loaded once at startup, so a query does not pay for reading or computing the table.
+Run this file by running `python query_server.py table_file_name` in terminal. See --help for the socket options.
+
+Protocol: line-delimited JSON. Each request is one JSON object on one line and gets exactly one JSON object on one line as the response.
+Responses on a connection are in the same order as the requests.
+Queries are answered in a thread pool, so that a slow query, like a large page of minimal sets, does not hold up the requests of other connections.
+
+{"id": 7, "fulfilled_credits": [0, 1, 0, ...]}
+	-> {"id": 7, "result": [vector ids of a minimal set of vectors that fulfills the remaining credits]}
+	"include": [vector ids] and "exclude": [vector ids] may be added to only get sets that contain all of include and none of exclude.
+	The result is null if there is no such set.
+	If the server has a course index, the response also has "courses": [the course codes of each vector id in result].
+{"id": 8, "fulfilled_credits": [0, 1, 0, ...], "page_size": 20, "cursor": null}
+	-> {"id": 8, "results": [up to page_size lists of vector ids], "cursor": "..."}
+	Returns every minimal set, page by page, always in the same order. Pass the returned cursor to get the next page.
+	If the server has a course index, the response also has "courses", with the course codes of each vector id of each set.
+	The returned cursor is null after the last page. Cursors are only valid until the table is reloaded.
+	"include" and "exclude" are not supported with "page_size".
+{"id": 9, "command": "metrics"}
+	-> {"id": 9, "metrics": {"requests": ..., "errors": ..., "mean_ms": ..., "p50_ms": ..., "p95_ms": ..., "p99_ms": ..., "max_ms": ..., "reloads": ...}}
+Any request that cannot be answered
+	-> {"id": ..., "error": "description"}
+"id" is optional and is copied to the response.
+
+The server checks the table file every RELOAD_CHECK_INTERVAL_IN_SECONDS seconds.
+If the file was replaced by a new finalized table file, new requests are answered from the new table.
+If the new file is not a finalized table yet, the old table keeps being used and the file is checked again later.
+If the checksum of the table file does not match, requests are answered with an error until the file is replaced.
+To replace a table, write the new table to another file and rename it over the old one.
+The course index (see course_index.py) is loaded from --course-index, or else from the file named course_index_file_name(table_file_name) if it exists, and reloaded with the table.
+Overwriting the file in place while it is served may crash the server, since the old table is memory-mapped.
+'''
+
+import asyncio
+import argparse
+import json
+import os
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from algo3 import open_table, make_table_query_function, parse_fulfilled_credits
+from course_index import CourseIndex, course_index_file_name
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+RELOAD_CHECK_INTERVAL_IN_SECONDS = 5
+MAX_PAGE_SIZE = 1000
+# Number of threads that answer queries
+DEFAULT_THREADS = 4
+
+# Number of most recent request latencies that the latency percentiles are computed from
+LATENCY_WINDOW = 1 << 12
+
+class LatencyMetrics:
+	def __init__(self):
+		self.requests = 0
+		self.errors = 0
+		self.total_seconds = 0.0
+		self.max_seconds = 0.0
+		self.recent_seconds = deque(maxlen = LATENCY_WINDOW)
+		self.reloads = 0
+
+	def record(self, seconds, is_error):
+		self.requests += 1
+		if is_error:
+			self.errors += 1
+		self.total_seconds += seconds
+		self.max_seconds = max(self.max_seconds, seconds)
+		self.recent_seconds.append(seconds)
+
+	def summary(self):
+		recent = sorted(self.recent_seconds)
+		def percentile(p):
+			if len(recent) == 0:
+				return 0.0
+			return recent[min(len(recent) - 1, int(p / 100 * len(recent)))] * 1000
+		return {
+			'requests': self.requests,
+			'errors': self.errors,
+			'mean_ms': self.total_seconds / self.requests * 1000 if self.requests > 0 else 0.0,
+			'p50_ms': percentile(50),
+			'p95_ms': percentile(95),
+			'p99_ms': percentile(99),
+			'max_ms': self.max_seconds * 1000,
+			'reloads': self.reloads,
+		}
+
+# Raises ValueError if value is not a list of vector ids
+def parse_vector_ids(value):
+	if not isinstance(value, list):
+		raise ValueError('include and exclude must be lists of vector ids')
+	for x in value:
+		if not isinstance(x, int) or isinstance(x, bool):
+			raise ValueError('include and exclude must be lists of vector ids')
+	return value
+
+# Identifies the version of a file, so that a replaced file is noticed
+def file_signature(file_name):
+	stat = os.stat(file_name)
+	return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+class QueryServer:
+	# course_index_file_name is None to use the course index next to the table file, if there is one
+	# threads is the number of threads that answer queries
+	def __init__(self, table_file_name, course_index_file_name = None, threads = DEFAULT_THREADS):
+		self.table_file_name = table_file_name
+		self.course_index_file_name = course_index_file_name
+		self.metrics = LatencyMetrics()
+		self.executor = ThreadPoolExecutor(max_workers = threads)
+		self.load()
+
+	# Raises RuntimeError if the file is not a finalized table file, or if the given course index is not the index of the table's problem
+	# The checksum of the table file is checked in the background, so that loading stays fast. watch_table_file stops using the table if it does not match.
+	def load(self):
+		signature = file_signature(self.table_file_name)
+		table = open_table(self.table_file_name, verify = 'background')
+		index = self.load_course_index(table)
+		# All are replaced at once so that a request never sees the query function of one table and the credit_maxes of another
+		self.loaded = (make_table_query_function(table), table.credit_maxes, index)
+		self.table = table
+		self.signature = signature
+
+	# Return: the CourseIndex of the table's problem, or None if there is none
+	def load_course_index(self, table):
+		file_name = self.course_index_file_name
+		if file_name is None:
+			file_name = course_index_file_name(self.table_file_name)
+			if not os.path.exists(file_name):
+				return None
+		index = CourseIndex(file_name)
+		if not index.matches(table.credit_maxes, [vector for id, vector in table.vectors_with_ids]):
+			if self.course_index_file_name is None:
+				print('not using {:s}: it is the course index of another problem'.format(file_name))
+				return None
+			raise RuntimeError('{:s} is the course index of another problem'.format(file_name))
+		return index
+
+	async def watch_table_file(self):
+		while True:
+			await asyncio.sleep(RELOAD_CHECK_INTERVAL_IN_SECONDS)
+			if self.table is not None and self.table.checksum_ok is False:
+				print('not using {:s}: its checksum does not match'.format(self.table_file_name))
+				self.loaded = None
+				self.table = None
+			try:
+				if file_signature(self.table_file_name) == self.signature:
+					continue
+				self.load()
+				self.metrics.reloads += 1
+				print('reloaded {:s}'.format(self.table_file_name))
+			except (OSError, RuntimeError) as e:
+				print('not reloading {:s}: {!s:s}'.format(self.table_file_name, e))
+
+	def answer(self, request):
+		if not isinstance(request, dict):
+			raise ValueError('request is not a JSON object')
+		if request.get('command') == 'metrics':
+			return {'metrics': self.metrics.summary()}
+		if 'command' in request:
+			raise ValueError('unknown command')
+
+		if self.loaded is None:
+			raise ValueError('the table file is corrupt and has not been replaced yet')
+		query, credit_maxes, index = self.loaded
+		fulfilled_credits = parse_fulfilled_credits(request.get('fulfilled_credits'), credit_maxes)
+		if 'page_size' in request:
+			if 'include' in request or 'exclude' in request:
+				raise ValueError('include and exclude are not supported with page_size')
+			page_size = request['page_size']
+			if not isinstance(page_size, int) or isinstance(page_size, bool) or not 1 <= page_size <= MAX_PAGE_SIZE:
+				raise ValueError('page_size must be an integer from 1 to {:d}'.format(MAX_PAGE_SIZE))
+			results, cursor = query.query_page(fulfilled_credits, page_size, request.get('cursor'))
+			response = {'results': results, 'cursor': cursor}
+			if index is not None:
+				response['courses'] = [[index.course_codes(x) for x in result] for result in results]
+			return response
+		include = parse_vector_ids(request.get('include', []))
+		exclude = parse_vector_ids(request.get('exclude', []))
+		result = query(fulfilled_credits, include, exclude)
+		response = {'result': result}
+		if index is not None:
+			response['courses'] = None if result is None else [index.course_codes(x) for x in result]
+		return response
+
+	# Same as answer, but runs in the thread pool so that the event loop keeps serving other connections.
+	# The metrics command is answered on the event loop, which is the only thread that changes the metrics.
+	async def answer_in_pool(self, request):
+		if isinstance(request, dict) and request.get('command') == 'metrics':
+			return self.answer(request)
+		return await asyncio.get_running_loop().run_in_executor(self.executor, self.answer, request)
+
+	async def handle_connection(self, reader, writer):
+		try:
+			while True:
+				line = await reader.readline()
+				if len(line) == 0:
+					break
+				if len(line.strip()) == 0:
+					continue
+
+				start = time.perf_counter()
+				request = None
+				try:
+					request = json.loads(line.decode('utf-8'))
+					response = await self.answer_in_pool(request)
+					is_error = False
+				except (ValueError, UnicodeDecodeError) as e:
+					response = {'error': str(e)}
+					is_error = True
+				except Exception:
+					# A bug in answering one request must not close the connection without a response
+					print('internal error answering {!r:s}:'.format(line))
+					traceback.print_exc()
+					response = {'error': 'internal error'}
+					is_error = True
+				if isinstance(request, dict) and 'id' in request:
+					response['id'] = request['id']
+				self.metrics.record(time.perf_counter() - start, is_error)
+
+				writer.write(json.dumps(response).encode('utf-8') + b'\n')
+				await writer.drain()
+		except ConnectionError:
+			pass
+		finally:
+			writer.close()
+
+# Listens on the socket given by args and serves requests with server until cancelled
+async def serve(server, args):
+	if args.unix is not None:
+		listener = await asyncio.start_unix_server(server.handle_connection, path = args.unix)
+		print('listening on {:s}'.format(args.unix))
+	else:
+		listener = await asyncio.start_server(server.handle_connection, host = args.host, port = args.port)
+		print('listening on {:s}:{:d}'.format(args.host, args.port))
+	watcher = asyncio.ensure_future(server.watch_table_file())
+
+	try:
+		await listener.serve_forever()
+	finally:
+		watcher.cancel()
+		listener.close()
+		await listener.wait_closed()
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Serves queries on a finalized algo3 table file.')
+	parser.add_argument('table_file_name')
+	parser.add_argument('--host', default = DEFAULT_HOST)
+	parser.add_argument('--port', type = int, default = DEFAULT_PORT)
+	parser.add_argument('--unix', metavar = 'SOCKET_PATH', help = 'listen on a unix socket instead of TCP')
+	parser.add_argument('--threads', type = int, default = DEFAULT_THREADS, help = 'number of threads that answer queries')
+	parser.add_argument('--course-index', metavar = 'COURSE_INDEX_FILE_NAME', help = 'course index to answer with course codes, by default the one next to the table file')
+	args = parser.parse_args()
+
+	start = time.time()
+	server = QueryServer(args.table_file_name, args.course_index, args.threads)
+	print('loading {:s} required {:.2f} seconds'.format(args.table_file_name, time.time() - start))
+
+	try:
+		asyncio.run(serve(server, args))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.executor.shutdown(wait = False)
+		print(json.dumps(server.metrics.summary()))
@@ -0,0 +1,79 @@
+'''
+Checks query_all and query_page of algo3.py against a brute force search over all sets of vectors.
+
+Run this file by running `python -m unittest test_query_all` in terminal.
+'''
+
+import itertools
+import os
+import random
+import tempfile
+import unittest
+
+import algo3
+
+# Return: the minimal sets of vectors that fulfill credit_maxes given fulfilled_credits, each as a sorted tuple of vectors
+# Sets that only differ in which copies of a vector they select are the same tuple.
+def brute_force_minimal_sets(credit_maxes, vectors, fulfilled_credits):
+	for size in range(len(vectors) + 1):
+		found = set()
+		for ids in itertools.combinations(range(len(vectors)), size):
+			state = list(fulfilled_credits)
+			for i in ids:
+				state = [min(x + y, z) for x, y, z in zip(state, vectors[i], credit_maxes)]
+			if tuple(state) == credit_maxes:
+				found.add(tuple(sorted([vectors[i] for i in ids])))
+		if len(found) > 0:
+			return found
+	return set()
+
+class QueryAllTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def make_query(self, name, credit_maxes, vectors):
+		return algo3.make_query_function(credit_maxes, vectors, os.path.join(self.directory.name, name))
+
+	def check_state(self, query, credit_maxes, vectors, fulfilled_credits):
+		sets = [ids for ids, cursor in query.query_all(fulfilled_credits)]
+		as_vectors = [tuple(sorted([vectors[i] for i in ids])) for ids in sets]
+		self.assertEqual(len(as_vectors), len(set(as_vectors)), 'a set was yielded twice for {!s:s}'.format(fulfilled_credits))
+		self.assertEqual(set(as_vectors), brute_force_minimal_sets(credit_maxes, vectors, fulfilled_credits), 'wrong sets for {!s:s}'.format(fulfilled_credits))
+
+		# Pages of one set continue where the previous page stopped
+		pages = []
+		page, cursor = query.query_page(fulfilled_credits, 1)
+		pages.extend(page)
+		while cursor is not None:
+			page, cursor = query.query_page(fulfilled_credits, 1, cursor)
+			pages.extend(page)
+		self.assertEqual(pages, sets)
+
+	# The table stores a last index of 5 at (0, 0, 0, 0), but a minimal set ends at index 4
+	def test_last_index_is_not_a_bound(self):
+		credit_maxes = (1, 2, 2, 2)
+		vectors = ((1, 0, 0, 1), (0, 1, 1, 0), (0, 0, 0, 0), (1, 0, 1, 0), (0, 0, 1, 0), (1, 0, 0, 1), (0, 0, 0, 1), (1, 1, 0, 0), (1, 0, 0, 1), (1, 0, 0, 1))
+		query = self.make_query('example', credit_maxes, vectors)
+		sets = [ids for ids, cursor in query.query_all((0, 0, 0, 0))]
+		self.assertEqual(len(sets), 4)
+		self.assertTrue(any(3 in ids for ids in sets))
+		self.check_state(query, credit_maxes, vectors, (0, 0, 0, 0))
+
+	def test_random_problems(self):
+		rng = random.Random(0)
+		for problem in range(20):
+			credit_maxes = tuple([rng.randint(1, 2) for _ in range(4)])
+			vectors = tuple([tuple([int(rng.random() < 0.4) for _ in credit_maxes]) for _ in range(9)])
+			# Tables are only built for problems where all the vectors together fulfill credit_maxes
+			if len(brute_force_minimal_sets(credit_maxes, vectors, (0,) * len(credit_maxes))) == 0:
+				continue
+			query = self.make_query('random{:d}'.format(problem), credit_maxes, vectors)
+			for fulfilled_credits in itertools.product(*[range(x + 1) for x in credit_maxes]):
+				if len(brute_force_minimal_sets(credit_maxes, vectors, fulfilled_credits)) > 0:
+					self.check_state(query, credit_maxes, vectors, fulfilled_credits)
+
+if __name__ == '__main__':
+	unittest.main()
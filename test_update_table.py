@@ -0,0 +1,115 @@
+'''
+Checks that algo3.update_table writes the same table file as computing the table of the new vectors with algo3.make_query_function,
+and that algo2.build_table computes the same table with several processes as with one.
+
+Run this file by running `python -m unittest test_update_table` in terminal.
+'''
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+import algo2
+import algo3
+
+# Return: True if all the vectors together fulfill credit_maxes, which is needed to build a table
+def is_feasible(credit_maxes, vectors):
+	return all([sum([v[j] for v in vectors]) >= x for j, x in enumerate(credit_maxes)])
+
+def random_vectors(rng, credit_maxes, count):
+	return tuple([tuple([int(rng.random() < 0.4) for _ in credit_maxes]) for _ in range(count)])
+
+class UpdateTableTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def file_name(self, name):
+		return os.path.join(self.directory.name, name)
+
+	# Writes the table of vectors to the file name, discarding the progress output
+	def make_table(self, name, credit_maxes, vectors, packed):
+		with contextlib.redirect_stdout(io.StringIO()):
+			algo3.make_query_function(credit_maxes, vectors, self.file_name(name), packed = packed)
+		return algo3.open_table(self.file_name(name))
+
+	def check_update(self, name, credit_maxes, old_vectors, new_vectors, packed):
+		old_table = self.make_table(name + '_old', credit_maxes, old_vectors, packed)
+		updated = algo3.update_table(old_table, new_vectors, self.file_name(name + '_updated'))
+		self.make_table(name + '_fresh', credit_maxes, new_vectors, packed)
+		self.assertIsInstance(updated, algo3.PackedTable if packed else algo3.Table)
+		with open(self.file_name(name + '_updated'), 'rb') as f:
+			updated_bytes = f.read()
+		with open(self.file_name(name + '_fresh'), 'rb') as f:
+			fresh_bytes = f.read()
+		self.assertEqual(updated_bytes, fresh_bytes, 'the updated table of {:s} differs from the fresh one'.format(name))
+
+	def check_random_updates(self, change, packed):
+		rng = random.Random(0)
+		checked = 0
+		for problem in range(30):
+			credit_maxes = tuple([rng.randint(1, 2) for _ in range(4)])
+			old_vectors = random_vectors(rng, credit_maxes, 9)
+			new_vectors = change(rng, credit_maxes, old_vectors)
+			if not is_feasible(credit_maxes, old_vectors) or not is_feasible(credit_maxes, new_vectors):
+				continue
+			self.check_update('random{:d}_{:s}'.format(problem, 'packed' if packed else 'dense'), credit_maxes, old_vectors, new_vectors, packed)
+			checked += 1
+		self.assertGreater(checked, 0)
+
+	def test_added_vectors(self):
+		for packed in (False, True):
+			with self.subTest(packed = packed):
+				self.check_random_updates(lambda rng, credit_maxes, vectors: vectors + random_vectors(rng, credit_maxes, 2), packed)
+
+	def test_removed_vectors(self):
+		for packed in (False, True):
+			with self.subTest(packed = packed):
+				self.check_random_updates(lambda rng, credit_maxes, vectors: vectors[2:], packed)
+
+	# A course whose hub units changed keeps its id, so its vector changes in place
+	def test_changed_vectors(self):
+		def change(rng, credit_maxes, vectors):
+			i = rng.randrange(len(vectors))
+			j = rng.randrange(len(credit_maxes))
+			changed = tuple([1 - x if k == j else x for k, x in enumerate(vectors[i])])
+			return vectors[:i] + (changed,) + vectors[i + 1:]
+		for packed in (False, True):
+			with self.subTest(packed = packed):
+				self.check_random_updates(change, packed)
+
+class ParallelBuildTest(unittest.TestCase):
+	def setUp(self):
+		self.min_shard_states = algo2.PARALLEL_BUILD_MIN_SHARD_STATES
+		# Every level with at least one state per process is split into shards
+		algo2.PARALLEL_BUILD_MIN_SHARD_STATES = 1
+
+	def tearDown(self):
+		algo2.PARALLEL_BUILD_MIN_SHARD_STATES = self.min_shard_states
+
+	def test_same_table_as_serial(self):
+		rng = random.Random(0)
+		checked = 0
+		for problem in range(5):
+			credit_maxes = tuple([rng.randint(1, 3) for _ in range(5)])
+			vectors = random_vectors(rng, credit_maxes, 16)
+			if not is_feasible(credit_maxes, vectors):
+				continue
+			vectors = algo2.remove_unneeded_vectors(credit_maxes, sorted(vectors, reverse = True))
+			serial = algo2.build_table(credit_maxes, vectors)
+			for processes in (2, 3):
+				parallel = algo2.build_table(credit_maxes, vectors, processes = processes)
+				self.assertTrue(np.array_equal(serial.sizes, parallel.sizes))
+				self.assertTrue(np.array_equal(serial.last_indices, parallel.last_indices))
+			checked += 1
+		self.assertGreater(checked, 0)
+
+if __name__ == '__main__':
+	unittest.main()
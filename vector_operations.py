@@ -68,3 +68,32 @@ def int_to_vector(maxes, encoded):
 		encoded //= (a + 1)
 	assert encoded == 0
 	return tuple(out)
+
+# Place value of each component in the encoding used by vector_to_int
+# vector_to_int(maxes, vec) == sum(a * b for a, b in zip(vec, vector_strides(maxes)))
+def vector_strides(maxes):
+	out = [1] * len(maxes)
+	for i in range(len(maxes) - 2, -1, -1):
+		out[i] = out[i + 1] * (maxes[i + 1] + 1)
+	return tuple(out)
+
+# Precomputes (stride, radix, value) for each nonzero component of vec.
+# This lets int_vector_sub and int_vector_add work on the encoded ints without decoding them to tuples.
+def int_vector_digits(maxes, vec):
+	assert len(maxes) == len(vec)
+	return tuple([(stride, a + 1, b) for a, b, stride in zip(maxes, vec, vector_strides(maxes)) if b != 0])
+
+# Same as vector_to_int(maxes, vector_sub(int_to_vector(maxes, encoded), vec)) where digits == int_vector_digits(maxes, vec)
+def int_vector_sub(encoded, digits):
+	for stride, radix, b in digits:
+		a = encoded // stride % radix
+		encoded -= (a if a < b else b) * stride
+	return encoded
+
+# Component-wise addition, and if component of sum is greater than the corresponding component of maxes, set it to that component
+# Same as vector_to_int(maxes, vector_sub(maxes, vector_sub(vector_sub(maxes, int_to_vector(maxes, encoded)), vec))) where digits == int_vector_digits(maxes, vec)
+def int_vector_add(encoded, digits):
+	for stride, radix, b in digits:
+		a = radix - 1 - encoded // stride % radix
+		encoded += (a if a < b else b) * stride
+	return encoded